@@ -1,8 +1,21 @@
 import os
-import streamlit as st
-import importlib
+from utils.exercise_registry import ExerciseRegistry
+
+with ExerciseRegistry.profiled("app startup", "startup"):
+    import streamlit as st
+    from llm.fake import fake_backend_enabled
+    from llm.scheduler import scheduler
+    from utils.resource_cache import ResourceCache
+    from utils.span_tracer import SpanTracer
+
+# spans exported from the trace panel are appended here, one JSON object per line
+TRACE_FILE = "./traces.jsonl"
 
 def setup_api_key() -> bool:
+    if fake_backend_enabled():
+        # offline fake backend (LLM_BACKEND=fake) needs no keys
+        return True
+
     if "openai_api_key" in st.session_state and "groq_api_key" in st.session_state:
         # Keys are already entered → no need to show input
         return True
@@ -104,7 +117,67 @@ if st.session_state.selected_exercise:
     # Load and run
     if selected_exercise_path:
         if selected_exercise_path.strip():
-            module = importlib.import_module(selected_exercise_path)
-            module.run()
+            # imported on first selection only, timed for the import profile panel
+            module = ExerciseRegistry.load(selected_exercise_path)
+            tracer = SpanTracer(name=st.session_state.selected_exercise)
+            with tracer.activate():
+                module.run()
+            # reruns without any LLM work keep showing the last trace
+            if tracer.spans:
+                st.session_state.last_trace = tracer
         else:
-            st.warning("⚠️ Exercise not implemented yet.")
\ No newline at end of file
+            st.warning("⚠️ Exercise not implemented yet.")
+
+def trace_panel():
+    tracer = st.session_state.get("last_trace")
+    if tracer is None:
+        return
+    with st.sidebar.expander("⏱️ Trace of the last run", expanded=False):
+        summary = tracer.summary()
+        st.caption(
+            f"{tracer.name}: {summary['wall_ms']} ms, {summary['llm_calls']} LLM calls, "
+            f"{summary['input_tokens']}→{summary['output_tokens']} tokens, "
+            f"{summary['cache_hits']} cache hits, {summary['retries']} retries"
+        )
+        st.code(tracer.render(), language="text")
+        if st.button("Export to traces.jsonl"):
+            count = tracer.export_jsonl(TRACE_FILE)
+            st.success(f"Appended {count} spans to {TRACE_FILE}")
+
+def import_profile_panel():
+    loads = ExerciseRegistry.profile()
+    if not loads:
+        return
+    with st.sidebar.expander("🚀 Import profile", expanded=False):
+        st.dataframe(
+            [{key: load[key] for key in ("name", "kind", "import_ms", "modules")} for load in loads],
+            hide_index=True
+        )
+        slowest = st.selectbox("Slowest modules of", [load["name"] for load in loads])
+        top = next(load["top"] for load in loads if load["name"] == slowest)
+        st.dataframe(top, hide_index=True)
+
+def resource_cache_panel():
+    resources = ResourceCache.stats()
+    if not resources:
+        return
+    with st.sidebar.expander("🧱 Cached resources", expanded=False):
+        st.dataframe(resources, hide_index=True)
+        if st.button("Rebuild on next use"):
+            count = ResourceCache.invalidate()
+            st.success(f"Dropped {count} cached resources")
+
+def rate_limit_panel():
+    models = scheduler.stats()
+    if not models:
+        return
+    with st.sidebar.expander("🚦 Rate limits", expanded=False):
+        queued = sum(model["queue_depth"] for model in models)
+        throttle_ms = sum(model["throttle_ms"] for model in models)
+        st.caption(f"{queued} requests queued, {throttle_ms:.0f} ms spent throttled")
+        st.dataframe(models, hide_index=True)
+
+trace_panel()
+import_profile_panel()
+resource_cache_panel()
+rate_limit_panel()
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+Benchmarks the columnar product catalog of exercise 9 on synthetic catalogs.
+
+For each size, reports the time to build the store, to open it cold and to
+answer a first query, and the latency of indexed filters against full-scan
+masks over the same columns. Catalogs up to --csv-max-rows rows are also
+loaded with pd.read_csv for comparison.
+
+    python -m benchmarks.catalog_loader --sizes 10000,1000000,10000000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.catalog_store import CatalogStore
+from utils.product_filter import FilterSpec, ProductFilter
+from utils.semantic_cache import percentile
+
+CATALOG_FILE = os.path.join(
+    os.path.dirname(__file__), "..", "exercises", "exercise_9_product_recommender", "Ecommerce_Product_List.csv"
+)
+
+SPECS = [
+    FilterSpec(categories=["Laptop"], max_price=1500, min_rating=4.5),
+    FilterSpec(categories=["Headphones"], sort_by="rating", descending=True, limit=5),
+    FilterSpec(min_price=200, max_price=210),
+    FilterSpec(min_rating=4.9, sort_by="price", limit=10),
+    FilterSpec(categories=["Smartphone", "Tablet"], max_price=300),
+    FilterSpec(sort_by="price", limit=5),
+]
+
+
+def synthetic_catalog(rows: int, seed: int = 0) -> pd.DataFrame:
+    # names and descriptions are drawn from the real catalog, prices and ratings at random
+    base = pd.read_csv(CATALOG_FILE)
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(base), rows)
+    return pd.DataFrame({
+        "Product_ID": [f"P{i:08d}" for i in range(rows)],
+        "Product_Name": base["Product_Name"].to_numpy()[picks],
+        "Category": base["Category"].to_numpy()[rng.integers(0, len(base), rows)],
+        "Price_USD": rng.integers(10, 3000, rows),
+        "Rating": rng.integers(10, 51, rows) / 10,
+        "Description": base["Description"].to_numpy()[picks],
+    })
+
+
+def scan(store: CatalogStore, spec: FilterSpec) -> np.ndarray:
+    # the previous approach: one boolean mask over every row per condition
+    mask = np.ones(len(store), dtype=bool)
+    codes = store.category_codes(spec.categories)
+    if codes:
+        mask &= np.isin(store.category_values(), codes)
+    price, rating = store.values("Price_USD"), store.values("Rating")
+    if spec.min_price is not None:
+        mask &= price >= spec.min_price
+    if spec.max_price is not None:
+        mask &= price <= spec.max_price
+    if spec.min_rating is not None:
+        mask &= rating >= spec.min_rating
+    return np.flatnonzero(mask)
+
+
+def latencies(fn, repeats: int) -> dict:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(percentile(timings, 50), 3), "p95_ms": round(percentile(timings, 95), 3)}
+
+
+def measure(rows: int, directory: str, csv_max_rows: int, repeats: int) -> dict:
+    df = synthetic_catalog(rows)
+    result = {"rows": rows}
+    if rows <= csv_max_rows:
+        csv_path = os.path.join(directory, f"catalog_{rows}.csv")
+        df.to_csv(csv_path, index=False)
+        start = time.perf_counter()
+        pd.read_csv(csv_path)
+        result["read_csv_s"] = round(time.perf_counter() - start, 3)
+
+    store_path = os.path.join(directory, f"store_{rows}")
+    start = time.perf_counter()
+    CatalogStore.build(df, store_path)
+    result["build_s"] = round(time.perf_counter() - start, 3)
+    del df
+
+    start = time.perf_counter()
+    store = CatalogStore(store_path)
+    result["open_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    start = time.perf_counter()
+    ProductFilter(store).apply(SPECS[0])
+    result["first_query_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+    # a fresh engine per repeat, so compiled specs are never reused
+    result["indexed"] = latencies(lambda: [ProductFilter(store).compile(spec) for spec in SPECS], repeats)
+    result["scan"] = latencies(lambda: [scan(store, spec) for spec in SPECS], repeats)
+    result["indexed_per_spec"] = {
+        json.dumps(spec.model_dump(exclude_defaults=True)): latencies(lambda spec=spec: ProductFilter(store).compile(spec), repeats)
+        for spec in SPECS
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,1000000,10000000", help="comma-separated catalog sizes")
+    parser.add_argument("--csv-max-rows", type=int, default=1_000_000, help="largest catalog also timed with read_csv")
+    parser.add_argument("--repeats", type=int, default=20, help="timed runs per query set")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = [
+            measure(int(size), directory, args.csv_max_rows, args.repeats)
+            for size in args.sizes.split(",")
+        ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
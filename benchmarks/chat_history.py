@@ -0,0 +1,84 @@
+"""
+Compares per-turn chat history latency of exercise 9's windowed history
+against SQLChatMessageHistory as memory.db grows.
+
+A turn reads the session's history and appends one user and one AI message.
+The database is seeded with messages spread over many sessions, the measured
+session holding --session-messages of them.
+
+    python -m benchmarks.chat_history --sizes 10000,100000,1000000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from langchain_community.chat_message_histories import SQLChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage, message_to_dict
+
+from utils.chat_history import TABLE_NAME, WindowedChatHistory
+from utils.semantic_cache import percentile
+
+SEED_SESSIONS = 10_000
+
+
+def seed(db_path: str, messages: int, session_messages: int) -> None:
+    message = json.dumps(message_to_dict(HumanMessage("I need a laptop under 1500 dollars rated 4.5 or more")))
+    connection = sqlite3.connect(db_path)
+    connection.execute(f"CREATE TABLE {TABLE_NAME} (id INTEGER NOT NULL PRIMARY KEY, session_id TEXT, message TEXT)")
+    # the measured session's messages are interleaved with everyone else's
+    step = max(1, messages // max(session_messages, 1))
+    connection.executemany(
+        f"INSERT INTO {TABLE_NAME} (session_id, message) VALUES (?, ?)",
+        (
+            ("measured" if i % step == 0 and i // step < session_messages else f"session-{i % SEED_SESSIONS}", message)
+            for i in range(messages)
+        )
+    )
+    connection.commit()
+    connection.close()
+
+
+def turn_latencies(history, turns: int) -> dict:
+    timings = []
+    for i in range(turns):
+        start = time.perf_counter()
+        window = history.messages[-20:]
+        history.add_messages([HumanMessage(f"question {i} after {len(window)}"), AIMessage(f"answer {i}")])
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(percentile(timings, 50), 3), "p95_ms": round(percentile(timings, 95), 3)}
+
+
+def measure(messages: int, directory: str, session_messages: int, turns: int) -> dict:
+    result = {"messages": messages}
+    for name in ("sql_chat_message_history", "windowed"):
+        db_path = os.path.join(directory, f"{name}_{messages}.db")
+        seed(db_path, messages, session_messages)
+        url = f"sqlite:///{db_path}"
+        if name == "windowed":
+            history = WindowedChatHistory("measured", url=url, retain=None)
+        else:
+            history = SQLChatMessageHistory("measured", connection=url)
+        result[name] = turn_latencies(history, turns)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated message counts")
+    parser.add_argument("--session-messages", type=int, default=500, help="messages already in the measured session")
+    parser.add_argument("--turns", type=int, default=50, help="timed turns per database")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = [
+            measure(int(size), directory, args.session_messages, args.turns)
+            for size in args.sizes.split(",")
+        ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
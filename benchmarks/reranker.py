@@ -0,0 +1,51 @@
+"""
+Measures cross-encoder rerank latency for a batch of candidates: the first
+call (model load + scoring), a warm call with new candidates and a repeated
+call served from the score cache.
+
+    python -m benchmarks.reranker --candidates 20 --quantize
+"""
+import argparse
+import json
+import time
+
+from exercises.exercise_24_search_engine.main import RERANKER_MODEL, SearchEngine
+from utils.reranker import RerankerService
+
+
+def timed(reranker, pairs) -> float:
+    start = time.perf_counter()
+    reranker.score(pairs)
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--quantize", action="store_true", help="int8 dynamic quantization on CPU")
+    args = parser.parse_args()
+
+    docs = SearchEngine.iter_wiki_docs()
+    candidates = [next(docs).page_content[:2000] for _ in range(2 * args.candidates)]
+    reranker = RerankerService(
+        RERANKER_MODEL, args.batch_size, args.max_length, backend=args.backend, quantize=args.quantize
+    )
+    cold = [("What is the cultural capital of India?", doc) for doc in candidates[:args.candidates]]
+    warm = [("Who founded the Mughal empire?", doc) for doc in candidates[args.candidates:]]
+    results = {
+        "model": RERANKER_MODEL,
+        "backend": args.backend,
+        "quantize": args.quantize,
+        "candidates": args.candidates,
+        "cold_ms": timed(reranker, cold),
+        "warm_ms": timed(reranker, warm),
+        "cached_ms": timed(reranker, warm),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
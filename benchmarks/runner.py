@@ -0,0 +1,333 @@
+"""
+Headless load benchmark for the exercise pipelines.
+
+Builds the chains of exercises 4, 6, 9 and 24 without the Streamlit UI and
+drives them with a synthetic workload at a configurable concurrency.
+Reports end-to-end and per-stage latency percentiles, throughput and peak
+RSS as JSON, and compares them against a stored baseline; peak RSS is only
+gated against a baseline recorded on the same host. By default every
+model runs on the offline fake backend with injected latency, so results
+measure the pipelines' own overhead and concurrency rather than a provider.
+
+    python -m benchmarks.runner --concurrency 8 --requests 64
+    python -m benchmarks.runner --scenario chat_turns --update-baseline
+    python -m benchmarks.runner --scenario chat_turns --pipeline sequential
+
+Exits with status 1 when a scenario regressed beyond --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit.config
+import streamlit.logger
+from langchain_core.tracers.context import collect_runs
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# stage latencies of these run types are reported per call position, e.g. the 2nd chat model of a turn
+ORDERED_RUN_TYPES = ("llm", "chat_model", "retriever")
+
+TICKETS = [
+    "I can't access my email. It keeps showing an error message. Please help.",
+    "Tengo problemas con la VPN. No puedo conectarme a la red de la empresa.",
+    "Mon imprimante ne répond pas et n'imprime plus. J'ai besoin d'aide pour la réparer.",
+    "我无法访问公司的网站。每次都显示错误信息。请帮忙解决。",
+    "Não consigo sincronizar meus contatos com o telefone. Sempre recebo uma mensagem de falha.",
+    "Ho problemi a stampare i documenti da remoto. Il lavoro non viene inviato alla stampante di rete.",
+    "プリンターのトナーを交換しましたが、印刷品質が低下しています。",
+    "Internet bağlantım çok yavaş ve bazen tamamen kesiliyor. Yardım eder misiniz?",
+]
+
+CONVERSATIONS = [
+    ["Hi, I need a new laptop", "Something under 1500 dollars", "Only ones rated 4.5 or more"],
+    ["Show me smartphones", "Which ones are cheaper than 800?", "What about tablets instead?"],
+    ["I want good headphones", "Rated at least 4.0 please", "And a charger to go with them"],
+]
+
+QUERIES = [
+    "What is machine learning?",
+    "How do convolutional neural networks process images?",
+    "Who founded the Roman Empire?",
+    "What is the difference between supervised and unsupervised learning?",
+    "How does the stock market work?",
+    "What causes climate change?",
+]
+
+
+def percentiles(values: list[float]) -> dict:
+    from utils.semantic_cache import percentile
+    return {f"p{q}": round(percentile(values, q), 1) for q in (50, 95, 99)}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def stage_durations(runs, ordered: bool) -> dict:
+    """
+    Flattens the traced run trees of one request into stage -> seconds.
+    """
+    spans = []
+    stack = list(runs)
+    while stack:
+        run = stack.pop()
+        stack.extend(run.child_runs)
+        if run.end_time is not None and run.run_type != "chain":
+            spans.append(run)
+    durations = defaultdict(float)
+    positions = defaultdict(int)
+    for run in sorted(spans, key=lambda run: run.start_time):
+        stage = f"{run.run_type}:{run.name}"
+        if ordered and run.run_type in ORDERED_RUN_TYPES:
+            positions[stage] += 1
+            stage = f"{stage}#{positions[stage]}"
+        durations[stage] += (run.end_time - run.start_time).total_seconds()
+    return durations
+
+
+def llm_calls(runs) -> int:
+    from llm.openai import LLM
+    return LLM.count_calls(runs)
+
+
+def ticket_batches(args) -> tuple[list, bool]:
+    from exercises.exercise_4_it_support_analyst.main import ITSupportAnalyst
+    analyst = ITSupportAnalyst()
+    # map() runs the tickets of a batch concurrently, so call positions carry no meaning here
+    return [
+        lambda i=i: analyst.ticket_analyst([f"{ticket} (#{i})" for ticket in TICKETS[:args.batch_size]])
+        for i in range(args.warmup + args.requests)
+    ], False
+
+
+def multilingual_tickets(args) -> tuple[list, bool]:
+    from exercises.exercise_6_linking_multiple_chains.main import LinkingMultipleChains
+    linking = LinkingMultipleChains()
+    final_chain = (
+        linking.detect_language()
+        | linking.translate_to_eng()
+        | linking.resolution_response_in_eng()
+        | linking.translate_response_to_src_lang()
+    )
+    return [
+        lambda i=i: final_chain.invoke({'orig_msg': f"{TICKETS[i % len(TICKETS)]} (#{i})"})
+        for i in range(args.warmup + args.requests)
+    ], True
+
+
+def chat_turns(args) -> tuple[list, bool]:
+    from exercises.exercise_9_product_recommender.main import ProductRecommender
+    recommender = ProductRecommender()
+
+    def conversation(i):
+        # turns of one session are sequential, sessions run concurrently
+        for turn in CONVERSATIONS[i % len(CONVERSATIONS)]:
+            recommender.chat_with_llm(prompt=turn, session_id=f"bench-{i}", mode=args.pipeline)
+
+    return [lambda i=i: conversation(i) for i in range(args.warmup + args.requests)], True
+
+
+def search_queries(args) -> tuple[list, bool]:
+    from langchain.retrievers import ContextualCompressionRetriever
+    from langchain_chroma import Chroma
+    from exercises.exercise_24_search_engine.main import EMBEDDING_MODEL, INGEST_BATCH_SIZE, SearchEngine
+    from llm.openai import LLM
+    from utils.batch_compressor import BatchLLMCompressor
+    from utils.bm25_index import BM25Index
+    from utils.chroma_db import ChromaDB
+    from utils.ingestion_manifest import IngestionManifest
+    from utils.multi_query import CachedMultiQueryRetriever
+
+    # ingest a slice of the Wikipedia corpus through the exercise's own upsert path
+    engine = SearchEngine.__new__(SearchEngine)
+    chroma = Chroma(
+        persist_directory="./bench_db",
+        collection_name="bench_db",
+        embedding_function=ChromaDB.embeddings(EMBEDDING_MODEL),
+        collection_metadata={"hnsw:space": "cosine"}
+    )
+    manifest = IngestionManifest("./bench_db/ingestion_manifest.json")
+    bm25_index = BM25Index()
+    docs = [doc for _, doc in zip(range(args.wiki_docs), SearchEngine.iter_wiki_docs())]
+    current = {SearchEngine.wiki_source(doc): SearchEngine.wiki_hash(doc) for doc in docs}
+    for start in range(0, len(docs), INGEST_BATCH_SIZE):
+        entries = [
+            (SearchEngine.wiki_source(doc), [doc], [f"wikipedia-{doc.metadata['id']}"])
+            for doc in docs[start:start + INGEST_BATCH_SIZE]
+        ]
+        engine.upsert_sources(chroma, bm25_index, manifest, current, entries)
+    engine.checkpoint(bm25_index, "./bench_db/bm25_index.pkl", manifest)
+
+    # the "Contextual Compression Retrieval - LLMChainFilter" path of the search engine
+    llm = LLM().openai_gpt4o()
+    compression_retriever = ContextualCompressionRetriever(
+        base_compressor=BatchLLMCompressor.from_llm(llm=llm, mode="filter"),
+        base_retriever=CachedMultiQueryRetriever.from_llm(vectorstore=chroma, llm=llm, k=3)
+    )
+    return [
+        lambda i=i: compression_retriever.invoke(f"{QUERIES[i % len(QUERIES)]} (#{i})")
+        for i in range(args.warmup + args.requests)
+    ], True
+
+
+SCENARIOS = {
+    "ticket_batches": ticket_batches,
+    "multilingual_tickets": multilingual_tickets,
+    "chat_turns": chat_turns,
+    "search_queries": search_queries,
+}
+# options that change what a scenario runs, a baseline is only comparable with the same values
+SCENARIO_OPTIONS = {"chat_turns": ("pipeline",)}
+
+
+def run_scenario(name: str, args) -> dict:
+    tasks, ordered = SCENARIOS[name](args)
+    # untimed requests first, so lazy imports and client setup stay out of the percentiles
+    for task in tasks[:args.warmup]:
+        task()
+    tasks = tasks[args.warmup:]
+
+    def timed(task):
+        with collect_runs() as collector:
+            start = time.perf_counter()
+            task()
+            elapsed = time.perf_counter() - start
+        return elapsed, stage_durations(collector.traced_runs, ordered), llm_calls(collector.traced_runs)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(timed, tasks))
+    wall = time.perf_counter() - start
+
+    stages = defaultdict(list)
+    for _, durations, _ in results:
+        for stage, seconds in durations.items():
+            stages[stage].append(seconds * 1000)
+    return {
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "options": {option: getattr(args, option) for option in SCENARIO_OPTIONS.get(name, ())},
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 2),
+        "latency_ms": percentiles([elapsed * 1000 for elapsed, _, _ in results]),
+        "llm_calls_per_request": round(sum(calls for _, _, calls in results) / len(results), 2),
+        "stages_ms": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        # high-water mark of the whole process, so later scenarios include earlier ones
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def host() -> str:
+    return f"{platform.node()} {platform.machine()} {platform.python_implementation()} {platform.python_version()}"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    if baseline.get("backend") != results["backend"]:
+        results["baseline"] = f"skipped: baseline was measured on {baseline.get('backend')}"
+        return []
+    # RSS depends on the machine, interpreter and allocator, so it is only gated on the baseline's host
+    same_host = baseline.get("host") == results["host"]
+    regressions = []
+    for name, result in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        if base["concurrency"] != result["concurrency"] or base["requests"] != result["requests"]:
+            result["baseline"] = "skipped: different concurrency or request count"
+            continue
+        if base.get("options", {}) != result["options"]:
+            result["baseline"] = f"skipped: baseline was measured with {base.get('options', {})}"
+            continue
+        checks = {
+            "latency p95": (result["latency_ms"]["p95"], base["latency_ms"]["p95"], True),
+            "latency p99": (result["latency_ms"]["p99"], base["latency_ms"]["p99"], True),
+            "throughput": (result["throughput_rps"], base["throughput_rps"], False),
+            "LLM calls per request": (result["llm_calls_per_request"], base.get("llm_calls_per_request", 0.0), True),
+        }
+        if same_host:
+            checks["peak RSS"] = (result["peak_rss_mb"], base["peak_rss_mb"], True)
+        result["baseline"] = {}
+        for metric, (current, previous, lower_is_better) in checks.items():
+            change = (current - previous) / previous if previous else 0.0
+            result["baseline"][metric] = f"{change:+.1%}"
+            if (change > tolerance) if lower_is_better else (change < -tolerance):
+                regressions.append(f"{name}: {metric} {previous} -> {current} ({change:+.1%})")
+        if not same_host:
+            result["baseline"]["peak RSS"] = "not gated: baseline was measured on another host"
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append", help="scenario to run, default all")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight")
+    parser.add_argument("--requests", type=int, default=32, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed requests before each scenario")
+    parser.add_argument("--batch-size", type=int, default=4, help="tickets per exercise 4 batch")
+    parser.add_argument("--wiki-docs", type=int, default=300, help="Wikipedia records ingested for exercise 24")
+    parser.add_argument("--latency-ms", type=float, default=50, help="fake model latency per call")
+    parser.add_argument("--tokens-per-sec", type=float, default=0, help="fake model generation speed, 0 for instant")
+    parser.add_argument("--pipeline", choices=("elided", "sequential"), default="elided", help="exercise 9 pipeline for chat_turns")
+    parser.add_argument("--live", action="store_true", help="call the real providers with OPENAI_API_KEY and GROQ_API_KEY")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.live:
+        import streamlit as st
+        st.session_state.openai_api_key = os.environ["OPENAI_API_KEY"]
+        st.session_state.groq_api_key = os.environ["GROQ_API_KEY"]
+    else:
+        os.environ["LLM_BACKEND"] = "fake"
+        os.environ["FAKE_LLM_LATENCY_MS"] = str(args.latency_ms)
+        os.environ["FAKE_LLM_TOKENS_PER_SEC"] = str(args.tokens_per_sec)
+
+    # bare mode warns about the missing script context on every st.* call
+    streamlit.config.set_option("logger.level", "error")
+    streamlit.logger.set_log_level("error")
+
+    baseline_path = os.path.abspath(args.baseline)
+    output_path = os.path.abspath(args.output) if args.output else None
+    sys.path.insert(0, REPO_DIR)
+    # chat history, caches and the vector DB go to a scratch directory, not the checkout
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+
+        results = {
+            "backend": "live" if args.live else f"fake ({args.latency_ms:g} ms/call)",
+            "host": host(),
+            "scenarios": {name: run_scenario(name, args) for name in args.scenario or SCENARIOS},
+        }
+        os.chdir(REPO_DIR)
+
+    regressions = []
+    if args.update_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    elif os.path.exists(baseline_path):
+        with open(baseline_path, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        results["regressions"] = regressions
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
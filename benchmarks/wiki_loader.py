@@ -0,0 +1,73 @@
+"""
+Compares the streaming Wikipedia loader of exercise 24 against the previous
+JSONLoader based path on a scaled copy of wikidata_rag_demo.jsonl.
+
+    python -m benchmarks.wiki_loader --scale 100
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from langchain_community.document_loaders import JSONLoader
+from langchain_core.documents import Document
+
+from exercises.exercise_24_search_engine.main import SearchEngine
+
+WIKI_FILE = os.path.join(
+    os.path.dirname(__file__), "..", "exercises", "exercise_24_search_engine", "rag_docs", "wikidata_rag_demo.jsonl"
+)
+
+
+def scaled_copy(scale: int, directory: str) -> str:
+    with open(WIKI_FILE, "r", encoding="utf-8") as file:
+        lines = [line.rstrip("\n") for line in file if line.strip()]
+    scaled_path = os.path.join(directory, "wikidata_scaled.jsonl")
+    with open(scaled_path, "w", encoding="utf-8") as file:
+        for _ in range(scale):
+            file.write("\n".join(lines) + "\n")
+    return scaled_path
+
+
+def legacy_wiki_docs(file_path: str) -> list:
+    # the loader exercise 24 used before: jq re-serializes every record, then it is parsed again
+    loader = JSONLoader(file_path=file_path, jq_schema=".", text_content=False, json_lines=True)
+    docs = []
+    for doc in loader.load():
+        record = json.loads(doc.page_content)
+        metadata = {"id": record["id"], "title": record["title"], "source": "Wikipedia"}
+        docs.append(Document(page_content=' '.join(record["paragraphs"]), metadata=metadata))
+    return docs
+
+
+def measure(load) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = load()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"docs": count, "seconds": round(elapsed, 3), "peak_mb": round(peak / 2**20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=100, help="number of copies of the JSONL file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = scaled_copy(args.scale, directory)
+        results = {
+            "scale": args.scale,
+            "file_mb": round(os.path.getsize(file_path) / 2**20, 1),
+            "legacy_jsonloader": measure(lambda: len(legacy_wiki_docs(file_path))),
+            # consume the generator without keeping documents, as batched ingestion does
+            "streaming": measure(lambda: sum(1 for _ in SearchEngine.iter_wiki_docs(file_path))),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
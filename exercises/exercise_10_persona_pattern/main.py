@@ -7,13 +7,16 @@ def run():
 
 class PersonaPattern:
     def __init__(self):
-        self.model = LLM().chat_groq
+        # deterministic prompt, so repeat clicks are answered from the response cache
+        self.model = LLM(cache=True).groq_chat("llama3-8b-8192", temperature=0.0)
 
     def run(self):
         st.markdown(self.persona())
         if st.button("Act as a marketing manager"):
             response = self.model.invoke(self.marketing_manager_prompt())
             st.write(response.content)
+            stats = LLM.cache_stats()
+            st.caption(f"🗄️ Response cache: {stats['hits']} hits / {stats['misses']} misses, {stats['saved_ms'] / 1000:.1f}s saved")
 
     def persona(self):
         return """
@@ -4,6 +4,11 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnableParallel, RunnablePassthrough
 
 from llm.openai import LLM
+from utils.chroma_db import ChromaDB
+from utils.semantic_cache import SemanticCache
+
+# cosine similarity above which a question reuses the answer to an earlier one
+SEMANTIC_CACHE_THRESHOLD = 0.95
 
 def run():
     SelfConsistencyPattern().run()
@@ -34,8 +39,16 @@ class SelfConsistencyPattern:
                 | self.self_con_prompt_template()
                 | gpt
             )
-            response = sc_chain.invoke({'problem': question})
-            st.write(response.content)
+            # near-duplicate questions skip the four GPT-4o calls
+            cache = SemanticCache.shared(
+                "self_consistency",
+                embed_fn=ChromaDB.embeddings(),
+                threshold=SEMANTIC_CACHE_THRESHOLD
+            )
+            answer, entry = cache.get_or_compute(question, lambda: sc_chain.invoke({'problem': question}).content)
+            st.write(answer)
+            if entry:
+                st.caption(f"♻️ From the semantic cache: similar to an earlier question ({entry['similarity']:.2f})")
     
     def cot_prompt_template(self):
         return ChatPromptTemplate.from_template("""
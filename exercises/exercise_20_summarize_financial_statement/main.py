@@ -2,9 +2,15 @@ from pathlib import Path
 import streamlit as st
 import os
 import tempfile
-import google.generativeai as genai
-from pdf2image import convert_from_path
-from PIL import Image
+from llm.fake import fake_backend_enabled
+from llm.openai import LLM
+from utils.exercise_registry import ExerciseRegistry
+from utils.ingestion_manifest import IngestionManifest
+from utils.job_queue import ACTIVE_STATUSES, JobQueue
+
+SUMMARY_JOB_KIND = "financial_summary"
+# seconds between two refreshes of the summary progress
+JOB_POLL_SECONDS = 2
 
 def run():
     SummarizeFinancialStatement().run()
@@ -15,24 +21,61 @@ class SummarizeFinancialStatement:
         # File uploader for PDF
         uploaded_pdf = st.file_uploader("Upload a financial statement PDF file", type=["pdf"])
         if uploaded_pdf:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-                temp_pdf.write(uploaded_pdf.read())
-                temp_pdf_path = temp_pdf.name
+            pdf_bytes = uploaded_pdf.getvalue()
+            pdf_hash = IngestionManifest.content_hash(pdf_bytes)
             if st.button("Summarize"):
-                image_paths = self.pdf_to_images(temp_pdf_path)
-                response_text = self.generate_summary_report(
-                    image_paths, 
-                    prompt=self.prompt()
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
+                    temp_pdf.write(pdf_bytes)
+                    temp_pdf_path = temp_pdf.name
+                # summarized in the background, the page stays usable and the result survives reruns
+                JobQueue.shared().submit(
+                    SUMMARY_JOB_KIND,
+                    lambda job: self.summarize(job, temp_pdf_path, pdf_hash),
+                    key=pdf_hash
                 )
-                st.write(response_text)
+            job = JobQueue.shared().latest(SUMMARY_JOB_KIND, pdf_hash)
+            if job is None:
+                return
+            if job["status"] in ACTIVE_STATUSES:
+                self.summary_progress(job["id"])
+            elif job["status"] == "succeeded":
+                st.write(job["result"]["summary"])
+            else:
+                st.progress(job["progress"], text=f"Summary {job['status']}: {job['message']}")
+                if job["error"]:
+                    st.error(job["error"].splitlines()[0])
+
+    @st.fragment(run_every=JOB_POLL_SECONDS)
+    def summary_progress(self, job_id):
+        queue = JobQueue.shared()
+        job = queue.get(job_id)
+        if job["status"] not in ACTIVE_STATUSES:
+            # the finished job is rendered by the full page, which stops this polling
+            st.rerun()
+        st.progress(job["progress"], text=f"Summary {job['status']}: {job['message']}")
+        if st.button("Cancel summary"):
+            queue.cancel(job_id)
+
+    def summarize(self, job, pdf_path, pdf_hash):
+        # converted pages are checkpointed, a resubmitted job goes straight to the summary
+        image_paths = job.checkpoint.get("image_paths")
+        if not image_paths or not all(os.path.exists(path) for path in image_paths):
+            job.progress(0.1, "Converting the PDF pages to images")
+            image_paths = self.pdf_to_images(pdf_path, output_folder=f"pdf_images/{pdf_hash[:16]}")
+            job.save_checkpoint({"image_paths": image_paths})
+        job.check_cancelled()
+        job.progress(0.5, f"Summarizing {len(image_paths)} pages")
+        return {"summary": self.generate_summary_report(image_paths, prompt=self.prompt())}
     
     def pdf_to_images(self, pdf_path, output_folder="pdf_images"):
         # Create an ./images folder if not exists
         script_dir = Path(__file__).parent.resolve()
         image_folder = script_dir / output_folder   
-        image_folder.mkdir(exist_ok=True)
+        image_folder.mkdir(parents=True, exist_ok=True)
         
-        images = convert_from_path(pdf_path)
+        # pdf2image and Gemini are imported on first use, not when the exercise is opened
+        pdf2image = ExerciseRegistry.dependency("pdf2image")
+        images = pdf2image.convert_from_path(pdf_path)
         image_paths = []
 
         for i, image in enumerate(images):
@@ -43,6 +86,12 @@ class SummarizeFinancialStatement:
         return image_paths
     
     def generate_summary_report(self, image_paths, prompt):
+        if fake_backend_enabled():
+            # offline fake backend, the page images are not sent anywhere
+            return LLM().fake_chat("gemini-1.5-flash-latest").invoke(prompt).content
+
+        genai = ExerciseRegistry.dependency("google.generativeai")
+        Image = ExerciseRegistry.dependency("PIL.Image")
         genai.configure(api_key="")
 
         #Load all images
@@ -1,7 +1,6 @@
 import os
 import streamlit as st
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+from utils.chroma_db import ChromaDB
 
 def run():
     SimilarityAndRankingBased()
@@ -20,6 +19,7 @@ class SimilarityAndRankingBased:
                 )
                 top3_docs = similarity_retriever.invoke(user_query)
                 st.write(top3_docs)
+                self.embedding_cache_caption()
 
         if st.button("MMR search"):
             if user_query.strip():
@@ -32,6 +32,7 @@ class SimilarityAndRankingBased:
                 )
                 top3_docs = mmr_retriever.invoke(user_query)
                 st.write(top3_docs)
+                self.embedding_cache_caption()
 
         st.markdown(
             """
@@ -84,6 +85,7 @@ class SimilarityAndRankingBased:
                 )
                 top3_docs = similarity_threshold_retriever.invoke(user_query)
                 st.write(top3_docs)
+                self.embedding_cache_caption()
         self.custom_retriever_desc()
                 
 
@@ -114,19 +116,12 @@ class SimilarityAndRankingBased:
         
     def chroma_db(self, docs):
         # details here: https://openai.com/blog/new-embedding-models-and-api-updates
-        os.environ['OPENAI_API_KEY'] = st.session_state.openai_api_key
-        openai_embed_model = OpenAIEmbeddings(model='text-embedding-3-small')
-
-        # create vector DB of docs and embeddings
-        chroma_db = Chroma.from_texts(
-            texts=docs,
-            collection_name='db_docs',
-            # need to set the distance function to cosine else it uses euclidean by default
-            # check https://docs.trychroma.com/guides#changing-the-distance-function
-            collection_metadata={"hnsw:space": "cosine"},
-            embedding=openai_embed_model
-        )
-        return chroma_db
+        # the store is built once per process and shared with the other retrieval exercises
+        return ChromaDB.shared_store(docs)
+
+    def embedding_cache_caption(self):
+        stats = ChromaDB.embedding_cache_stats()
+        st.caption(f"🗄️ Embedding cache: {stats['hits']} hits / {stats['misses']} misses")
 
     def custom_retriever_desc(self):
         st.markdown(
@@ -1,9 +1,7 @@
-import os
 import streamlit as st
 from llm.openai import LLM
-from langchain.retrievers.multi_query import MultiQueryRetriever 
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+from utils.multi_query import CachedMultiQueryRetriever
+from utils.chroma_db import ChromaDB
 from utils.file_utils import FileUtils
 from pathlib import Path
 import logging
@@ -32,13 +30,11 @@ class MultiQueryRetrieval:
 
         user_query = st.text_input("Enter your query")
         if st.button("Retrieve") and user_query.strip():
-            similarity_retriever = self.chroma_db().as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 3}
-            )
-            mq_retriever = MultiQueryRetriever.from_llm(
-                retriever=similarity_retriever,
-                llm=self.llm
+            # variants are cached per query, embedded in one request and searched concurrently
+            mq_retriever = CachedMultiQueryRetriever.from_llm(
+                vectorstore=self.chroma_db(),
+                llm=self.llm,
+                k=3
             )
             docs = mq_retriever.invoke(user_query)
             st.subheader("Retrieved Documents")
@@ -49,22 +45,15 @@ class MultiQueryRetrieval:
             log_output = self.log_buffer.getvalue()
             st.subheader("MultiQuery Logs")
             st.code(log_output, language="text")
+            stats = ChromaDB.embedding_cache_stats()
+            st.caption(f"🗄️ Embedding cache: {stats['hits']} hits / {stats['misses']} misses")
 
              # Optional: reset buffer if needed
             self.log_buffer.truncate(0)
             self.log_buffer.seek(0)
 
     def chroma_db(self):
-        os.environ['OPENAI_API_KEY'] = st.session_state.openai_api_key
-        openai_embed_model = OpenAIEmbeddings(model='text-embedding-3-small')
-        return Chroma.from_texts(
-            texts=self.docs(), 
-            collection_name='db_docs',
-            # need to set the distance function to cosine else it uses euclidean by default
-            # check https://docs.trychroma.com/guides#changing-the-distance-function
-            collection_metadata={"hnsw:space": "cosine"},
-            embedding=openai_embed_model
-        )
+        return ChromaDB.shared_store(self.docs())
 
     def docs(self):
         return [
@@ -3,8 +3,9 @@ import streamlit as st
 from utils.file_utils import FileUtils
 from pathlib import Path
 from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import LLMChainExtractor, LLMChainFilter
+from utils.batch_compressor import BatchLLMCompressor
 from utils.chroma_db import ChromaDB
+from utils.resource_cache import ResourceCache
 
 def run():
     ContextualCompressionRetrieverDemo()
@@ -19,28 +20,43 @@ class ContextualCompressionRetrieverDemo:
         )
         st.markdown(contents)
         st.title("Exercise")
+
+        user_query = st.text_input("Enter your query")
+        if st.button("Retrieve - LLMChainExtractor") and user_query.strip():
+            compression_retriever_chain_extractor, _ = self.cached_compression_retrievers()
+            docs = compression_retriever_chain_extractor.invoke(user_query)
+            st.write(docs)
+        
+        if st.button("Retrieve - LLMChainFilter") and user_query.strip():
+            _, compression_retriever_chain_filter = self.cached_compression_retrievers()
+            docs = compression_retriever_chain_filter.invoke(user_query)
+            st.write(docs)
+
+    def cached_compression_retrievers(self):
+        # built on first retrieval, then shared by every session and rerun using the same LLM client
+        return ResourceCache.get_or_build(
+            "contextual_compression_retrievers",
+            self.compression_retrievers,
+            key=LLM.client_key(self.llm),
+            replace=False
+        )
+
+    def compression_retrievers(self):
         # simple cosine distance based retriever
         similarity_retriever = ChromaDB.from_docs().as_retriever(search_type="similarity",
                                               search_kwargs={"k": 3})
 
-        # retrieves the documents similar to query and then applies the compressor
+        # retrieves the documents similar to query and then applies the compressor,
+        # judging all retrieved documents in one LLM call instead of one call each
         compression_retriever_chain_extractor = ContextualCompressionRetriever(
-            base_compressor=LLMChainExtractor.from_llm(llm=self.llm),
+            base_compressor=BatchLLMCompressor.from_llm(llm=self.llm, mode="extract"),
             base_retriever=similarity_retriever
         )
         compression_retriever_chain_filter = ContextualCompressionRetriever(
-            base_compressor=LLMChainFilter.from_llm(llm=self.llm), 
+            base_compressor=BatchLLMCompressor.from_llm(llm=self.llm, mode="filter"),
             base_retriever=similarity_retriever
         )
-
-        user_query = st.text_input("Enter your query")
-        if st.button("Retrieve - LLMChainExtractor") and user_query.strip():
-            docs = compression_retriever_chain_extractor.invoke(user_query)
-            st.write(docs)
-        
-        if st.button("Retrieve - LLMChainFilter") and user_query.strip():
-            docs = compression_retriever_chain_filter.invoke(user_query)
-            st.write(docs)
+        return compression_retriever_chain_extractor, compression_retriever_chain_filter
 
 
         
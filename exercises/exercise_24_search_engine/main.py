@@ -3,24 +3,58 @@ from importlib import metadata
 import io
 import json
 import logging
-from exercises.exercise_23_contextual_compression_retriever.main import ContextualCompressionRetrieverDemo
+import time
+from openai import RateLimitError
 import streamlit as st
 import os
-from langchain.document_loaders import JSONLoader
 from langchain.docstore.document import Document
 from llm.openai import LLM
+from llm.scheduler import BATCH, RequestScheduler
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import StrOutputParser
 from glob import glob
-from langchain.document_loaders import PyMuPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain.retrievers.document_compressors import LLMChainExtractor, LLMChainFilter
+from utils.multi_query import CachedMultiQueryRetriever
+from utils.batch_compressor import BatchLLMCompressor
 from langchain.retrievers import ContextualCompressionRetriever
 from langchain.retrievers.document_compressors import CrossEncoderReranker
-from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+from utils.chroma_db import ChromaDB
+from utils.ingestion_manifest import IngestionManifest
+from utils.bm25_index import BM25Index
+from utils.hybrid_retriever import HybridRetriever
+from utils.reranker import RerankerService
+from utils.semantic_cache import SemanticCache
+from utils.exercise_registry import ExerciseRegistry
+from utils.job_queue import ACTIVE_STATUSES, JobQueue
+
+EMBEDDING_MODEL = 'text-embedding-3-small'
+PERSIST_DIRECTORY = "./my_db"
+# flag file written by the old all-or-nothing ingestion
+LEGACY_INGESTION_FLAG = "./.ingestion_done"
+# documents embedded per Chroma upsert
+INGEST_BATCH_SIZE = 256
+# chunks upserted between two saves of the BM25 index and the manifest, each save rewrites the whole index
+INGEST_CHECKPOINT_CHUNKS = 10_000
+
+# cosine similarity above which a new question reuses the results of an earlier one
+SEARCH_CACHE_THRESHOLD = 0.95
+
+RERANKER_MODEL = "BAAI/bge-reranker-large"
+RERANKER_BATCH_SIZE = 16
+RERANKER_MAX_LENGTH = 512
+
+# number of chunk-context LLM calls in flight while ingesting a paper
+CONTEXT_MAX_CONCURRENCY = 8
+# papers above this many tokens are replaced by a hierarchical summary in the context prompt
+CONTEXT_DOC_TOKEN_BUDGET = 60_000
+CONTEXT_SUMMARY_SECTION_TOKENS = 8_000
+# chunk contexts generated between two job checkpoints
+CONTEXT_CHECKPOINT_CHUNKS = 32
+
+INGEST_JOB_KIND = "search_engine_ingest"
+# seconds between two refreshes of the ingestion progress
+JOB_POLL_SECONDS = 2
 
 def run():
     SearchEngine()
@@ -28,21 +62,32 @@ def run():
 class SearchEngine:
     def __init__(self):
         self.llm = LLM().openai_gpt4o()
-        self.wiki_docs = SearchEngine.wiki_data()
 
         # laod pdf
         # self.paper_docs = []
-        openai_embed_model = OpenAIEmbeddings(model='text-embedding-3-small')
         if 'data_ingested' not in st.session_state:
             st.session_state.data_ingested = False
 
         if st.button('Ingest data'):
-            chroma_db = self.data_ingest_or_load()
-            st.session_state.chroma_db = chroma_db
-            st.session_state.data_ingested = True
+            st.session_state.ingest_job = self.submit_ingestion()
+        if not st.session_state.data_ingested:
+            # pick up an ingestion started earlier by this or another session, or left to resume
+            job = JobQueue.shared().latest(INGEST_JOB_KIND, PERSIST_DIRECTORY)
+            if st.session_state.get("ingest_job") is None and job and job["status"] != "succeeded":
+                st.session_state.ingest_job = job["id"]
+            if st.session_state.get("ingest_job") is not None:
+                job = JobQueue.shared().get(st.session_state.ingest_job)
+                if job is not None and job["status"] in ACTIVE_STATUSES:
+                    self.ingestion_progress(job["id"])
+                elif job is not None:
+                    self.ingestion_outcome(job)
 
         if st.session_state.data_ingested:
             user_input = st.text_input("ask")
+            if st.session_state.get("search_cache_entry") is not None:
+                if st.button("🗑️ Forget last cached result"):
+                    self.search_cache().invalidate(st.session_state.search_cache_entry)
+                    st.session_state.search_cache_entry = None
             similarity_retriever =  st.session_state.chroma_db.as_retriever(
                 search_type="similarity",
                 search_kwargs={"k": 3}
@@ -50,60 +95,122 @@ class SearchEngine:
             if st.button("Similarity Retriever") and user_input.strip():
                 top_docs = similarity_retriever.invoke(user_input)
                 self.display_docs(top_docs)
+            if st.button("Hybrid Retriever (BM25 + Vector)") and user_input.strip():
+                hybrid_retriever = HybridRetriever(
+                    dense_retriever=st.session_state.chroma_db.as_retriever(
+                        search_type="similarity",
+                        search_kwargs={"k": 20}
+                    ),
+                    bm25_index=st.session_state.bm25_index,
+                    k=3,
+                    fetch_k=20
+                )
+                top_docs = hybrid_retriever.invoke(user_input)
+                self.display_docs(top_docs)
             if st.button("Multi Query Retriever") and user_input.strip():
                 self.set_logging()
-                mq_retriever = MultiQueryRetriever.from_llm(
-                    retriever = similarity_retriever,
-                    llm = self.llm
+                mq_retriever = CachedMultiQueryRetriever.from_llm(
+                    vectorstore=st.session_state.chroma_db,
+                    llm=self.llm,
+                    k=3
                 )
-                top_docs = mq_retriever.invoke(user_input)
+                top_docs = self.cached_search("multi_query", user_input, mq_retriever.invoke)
                 self.display_logs()
                 self.display_docs(top_docs)
             if st.button("Contextual Compression Retrieval - LLMChainExtractor") and user_input.strip():
                 self.set_logging()
-                mq_retriever = MultiQueryRetriever.from_llm(
-                    retriever = similarity_retriever,
-                    llm = self.llm
+                mq_retriever = CachedMultiQueryRetriever.from_llm(
+                    vectorstore=st.session_state.chroma_db,
+                    llm=self.llm,
+                    k=3
                 )
-                compressor = LLMChainExtractor.from_llm(llm=self.llm)
+                # one LLM call for all candidates instead of one per document
+                compressor = BatchLLMCompressor.from_llm(llm=self.llm, mode="extract")
                 compression_retriever = ContextualCompressionRetriever(
                     base_compressor=compressor,
                     base_retriever=mq_retriever
                 )
-                top_docs = compression_retriever.invoke(user_input)
+                top_docs = self.cached_search(compressor.mode, user_input, compression_retriever.invoke)
                 self.display_logs()
                 self.display_docs(top_docs)
             if st.button("Contextual Compression Retrieval - LLMChainFilter") and user_input.strip():
                 self.set_logging()
-                mq_retriever = MultiQueryRetriever.from_llm(
-                    retriever = similarity_retriever,
-                    llm = self.llm
+                mq_retriever = CachedMultiQueryRetriever.from_llm(
+                    vectorstore=st.session_state.chroma_db,
+                    llm=self.llm,
+                    k=3
                 )
-                compressor = LLMChainFilter.from_llm(llm=self.llm)
+                compressor = BatchLLMCompressor.from_llm(llm=self.llm, mode="filter")
                 compression_retriever = ContextualCompressionRetriever(
                     base_compressor=compressor,
                     base_retriever=mq_retriever
                 )
-                top_docs = compression_retriever.invoke(user_input)
+                top_docs = self.cached_search(compressor.mode, user_input, compression_retriever.invoke)
                 self.display_logs()
                 self.display_docs(top_docs)
             if st.button("Chained Retrieval Pipeline") and user_input.strip():
                 # Similarity Retrieval → Compression Filter → Reranker Model Retrieval
-                _filter = LLMChainFilter.from_llm(llm=self.llm)
+                _filter = BatchLLMCompressor.from_llm(llm=self.llm, mode="filter")
                 # Retriever 2 - retrieves the documents similar to query and then applies the filter
                 compressor_retriever = ContextualCompressionRetriever(
                     base_compressor=_filter, base_retriever=similarity_retriever
                 )
-                # download an open-source reranker model - BAAI/bge-reranker-v2-m3
-                reranker = HuggingFaceCrossEncoder(model_name="BAAI/bge-reranker-large")
+                # open-source reranker model, downloaded and loaded once per process
+                reranker = RerankerService.shared(
+                    model_name=RERANKER_MODEL,
+                    batch_size=RERANKER_BATCH_SIZE,
+                    max_length=RERANKER_MAX_LENGTH
+                )
                 reranker_compressor = CrossEncoderReranker(model=reranker, top_n=3)
                 # Retriever 3 - Uses a Reranker model to rerank retrieval results from the previous retriever
                 final_retriever = ContextualCompressionRetriever(
                     base_compressor=reranker_compressor, base_retriever=compressor_retriever
                 )
-                top_docs = final_retriever.invoke(user_input)
+                top_docs = self.cached_search("chained", user_input, final_retriever.invoke)
+                stats = reranker.stats()
+                st.caption(
+                    f"⏱️ Rerank: {stats['last_pairs']} candidates in {stats['last_latency_ms']} ms "
+                    f"({stats['hits']} cached / {stats['misses']} scored so far)"
+                )
                 self.display_docs(top_docs)
     
+    def search_cache(self):
+        return SemanticCache.shared(
+            "search_engine",
+            embed_fn=ChromaDB.embeddings(EMBEDDING_MODEL),
+            threshold=SEARCH_CACHE_THRESHOLD
+        )
+
+    @staticmethod
+    def store_version() -> str:
+        # changes whenever an ingestion saves the manifest, so results cached before it are not reused
+        manifest_path = os.path.join(PERSIST_DIRECTORY, "ingestion_manifest.json")
+        if not os.path.exists(manifest_path):
+            return ""
+        stat = os.stat(manifest_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def cached_search(self, scope, query, retrieve):
+        # near-duplicate questions reuse earlier results instead of new LLM round trips
+        cache = self.search_cache()
+        top_docs, entry = cache.get_or_compute(
+            query,
+            lambda: retrieve(query),
+            scope=f"{scope}@{self.store_version()}",
+            # an empty result is not worth serving to every similar question
+            should_cache=bool
+        )
+        st.session_state.search_cache_entry = entry["id"] if entry else None
+        if entry:
+            st.caption(f"♻️ From the semantic cache: similar to '{entry['prompt']}' ({entry['similarity']:.2f})")
+        stats = cache.stats()
+        st.caption(
+            f"🗄️ Semantic cache: {stats['hit_rate']:.0%} hit rate, "
+            f"hits p50/p95 {stats['hit_p50_ms']}/{stats['hit_p95_ms']} ms, "
+            f"misses p50/p95 {stats['miss_p50_ms']}/{stats['miss_p95_ms']} ms"
+        )
+        return top_docs
+
     def set_logging(self):
         self.log_buffer = io.StringIO()
         self.log_handler = logging.StreamHandler(self.log_buffer)
@@ -131,119 +238,368 @@ class SearchEngine:
             st.markdown(doc.page_content[:1000])
 
 
-    def data_ingest_or_load(self):
-        ingestion_flag_file = "./.ingestion_done"
+    def submit_ingestion(self):
+        # clients are resolved here, worker threads cannot read the session's API keys
+        embedding = ChromaDB.embeddings(EMBEDDING_MODEL)
+        return JobQueue.shared().submit(
+            INGEST_JOB_KIND,
+            lambda job: self.data_ingest_or_load(job, embedding),
+            key=PERSIST_DIRECTORY
+        )
+
+    @staticmethod
+    def ingestion_status(job):
+        st.progress(job["progress"], text=f"Ingestion {job['status']}: {job['message']}")
+        with st.expander("Ingestion log"):
+            st.code("\n".join(event["message"] for event in JobQueue.shared().events(job["id"])), language="text")
+
+    @st.fragment(run_every=JOB_POLL_SECONDS)
+    def ingestion_progress(self, job_id):
+        queue = JobQueue.shared()
+        job = queue.get(job_id)
+        if job is None or job["status"] not in ACTIVE_STATUSES:
+            # the finished job is rendered by the full page, which stops this polling
+            st.rerun()
+        self.ingestion_status(job)
+        if st.button("Cancel ingestion"):
+            queue.cancel(job_id)
+
+    def ingestion_outcome(self, job):
+        if job["status"] == "succeeded":
+            chroma_db, bm25_index, _, _ = self.open_stores(ChromaDB.embeddings(EMBEDDING_MODEL))
+            st.session_state.chroma_db = chroma_db
+            st.session_state.bm25_index = bm25_index
+            st.session_state.data_ingested = True
+            st.session_state.ingest_job = None
+            st.rerun()
+        self.ingestion_status(job)
+        if job["error"]:
+            st.error(job["error"].splitlines()[0])
+        if st.button("Resume ingestion"):
+            st.session_state.ingest_job = self.submit_ingestion()
+            st.rerun()
+
+    def open_stores(self, embedding):
+        chroma = Chroma(
+            persist_directory=PERSIST_DIRECTORY,
+            collection_name='my_db',
+            embedding_function=embedding,
+            collection_metadata={"hnsw:space": "cosine"}
+        )
+        bm25_path = os.path.join(PERSIST_DIRECTORY, "bm25_index.pkl")
+        return chroma, BM25Index.load(bm25_path), bm25_path, IngestionManifest(
+            os.path.join(PERSIST_DIRECTORY, "ingestion_manifest.json")
+        )
+
+    def data_ingest_or_load(self, job, embedding):
         current_dir = os.path.dirname(__file__)
         file_path = os.path.join(current_dir, "rag_docs")
         pdf_files = glob(f'{file_path}/*.pdf')
-        openai_embed_model = OpenAIEmbeddings(model='text-embedding-3-small')
-
-        # If ingestion done load chroma from disk
-        if os.path.exists(ingestion_flag_file):
-            st.success("✅ Data ingestion already completed.")
-            return Chroma(
-                persist_directory="./my_db",
-                collection_name='my_db',
-                embedding_function=openai_embed_model
+        chroma, bm25_index, bm25_path, manifest = self.open_stores(embedding)
+
+        # Stores built before the manifest existed have random chunk IDs that
+        # cannot be upserted or deleted per source, so start them over once.
+        if not manifest.sources and chroma._collection.count() > 0:
+            job.log("Rebuilding the vector DB created before per-source ingestion.")
+            chroma.reset_collection()
+        if os.path.exists(LEGACY_INGESTION_FLAG):
+            os.remove(LEGACY_INGESTION_FLAG)
+        # stores ingested before the BM25 index existed get it built from the stored chunks
+        if manifest.sources and not os.path.exists(bm25_path):
+            stored = chroma.get(include=["documents", "metadatas"])
+            bm25_index.upsert(
+                stored["ids"],
+                [Document(page_content=text, metadata=metadata or {})
+                 for text, metadata in zip(stored["documents"], stored["metadatas"])]
             )
-        
-        # Else: Perform ingestion 
-        st.warning("⏳ Data ingestion in progress...")
-        paper_docs = []
-        for file_path in pdf_files:
-            st.write(f"Creating contextual chunk for {file_path}")
-            contextual_chunks = self.create_contextual_chunks(file_path=file_path)
-            st.write(f"Finished contextual chunk for {file_path}")
-            paper_docs.extend(contextual_chunks)
-        
-        total_docs = self.wiki_docs + paper_docs
-        chroma = Chroma.from_documents(
-            documents=total_docs,
-            collection_name='my_db',
-            embedding=openai_embed_model,
-            collection_metadata={"hnsw:space": "cosine"},
-            persist_directory="./my_db"
-        )
+            bm25_index.save(bm25_path)
 
-        # Make ingestion complete
-        with open(ingestion_flag_file, "w") as file:
-            file.write("done")
-        
-        st.success("✅ Ingestion completed and DB created.")
-        return chroma
-            
+        pdf_sources = {f"pdf:{os.path.basename(pdf_file)}": pdf_file for pdf_file in pdf_files}
+        # first streaming pass only keeps the hashes, never the documents
+        current = {
+            SearchEngine.wiki_source(doc): SearchEngine.wiki_hash(doc)
+            for doc in SearchEngine.iter_wiki_docs()
+        }
+        for source, pdf_file in pdf_sources.items():
+            with open(pdf_file, "rb") as file:
+                current[source] = IngestionManifest.content_hash(file.read())
+
+        changed, removed = manifest.diff(current, embedding_model=EMBEDDING_MODEL)
+        if not changed and not removed:
+            job.progress(1.0, "✅ Data ingestion already completed.")
+            return {"changed": 0, "removed": 0}
+
+        # the manifest is saved at every checkpoint, so a resumed job only sees what is still missing
+        job.progress(0.0, f"⏳ Data ingestion in progress: {len(changed)} new or changed, {len(removed)} removed sources...")
+        stale_ids = [chunk_id for source in removed for chunk_id in manifest.chunk_ids(source)]
+        if stale_ids:
+            chroma.delete(ids=stale_ids)
+            bm25_index.delete(stale_ids)
+            bm25_index.save(bm25_path)
+        for source in removed:
+            manifest.remove(source)
+        manifest.save()
+
+        # wiki records are small, so stream the changed ones into batched upserts
+        changed_sources = set(changed)
+        done = 0
+        unsaved = 0
+        pending = []
+        for doc in SearchEngine.iter_wiki_docs():
+            source = SearchEngine.wiki_source(doc)
+            if source in changed_sources:
+                pending.append((source, [doc], [f"wikipedia-{doc.metadata['id']}"]))
+                if len(pending) >= INGEST_BATCH_SIZE:
+                    job.check_cancelled()
+                    unsaved += self.upsert_sources(chroma, bm25_index, manifest, current, pending)
+                    if unsaved >= INGEST_CHECKPOINT_CHUNKS:
+                        self.checkpoint(bm25_index, bm25_path, manifest)
+                        unsaved = 0
+                    done += len(pending)
+                    job.progress(done / len(changed), f"Ingested {done} of {len(changed)} sources")
+                    pending = []
+        self.upsert_sources(chroma, bm25_index, manifest, current, pending)
+        self.checkpoint(bm25_index, bm25_path, manifest)
+        done += len(pending)
+
+        for source in changed:
+            if source in pdf_sources:
+                job.check_cancelled()
+                pdf_file = pdf_sources[source]
+                job.log(f"Creating contextual chunk for {pdf_file}")
+                contextual_chunks = self.create_contextual_chunks(file_path=pdf_file, job=job)
+                job.log(f"Finished contextual chunk for {pdf_file}")
+                chunk_ids = [f"pdf-{os.path.basename(pdf_file)}-{i}" for i in range(len(contextual_chunks))]
+                self.upsert_sources(chroma, bm25_index, manifest, current, [(source, contextual_chunks, chunk_ids)])
+                # a paper's contexts are costly to regenerate, so each one is checkpointed
+                self.checkpoint(bm25_index, bm25_path, manifest)
+                done += 1
+                job.progress(done / len(changed), f"Ingested {done} of {len(changed)} sources")
+
+        job.progress(1.0, "✅ Ingestion completed and DB updated.")
+        return {"changed": len(changed), "removed": len(removed)}
+
+    def upsert_sources(self, chroma, bm25_index, manifest, current, entries) -> int:
+        if not entries:
+            return 0
+        docs, ids, stale_ids = [], [], []
+        for source, source_docs, chunk_ids in entries:
+            for doc, chunk_id in zip(source_docs, chunk_ids):
+                doc.metadata["chunk_id"] = chunk_id
+            docs.extend(source_docs)
+            ids.extend(chunk_ids)
+            # a changed source may now have fewer chunks than before
+            stale_ids.extend(set(manifest.chunk_ids(source)) - set(chunk_ids))
+        if stale_ids:
+            chroma.delete(ids=stale_ids)
+            bm25_index.delete(stale_ids)
+        chroma.add_documents(documents=docs, ids=ids)
+        bm25_index.upsert(ids, docs)
+
+        for source, _, chunk_ids in entries:
+            manifest.record(source, current[source], chunk_ids, embedding_model=EMBEDDING_MODEL)
+        return len(ids)
 
     @staticmethod
-    def wiki_data():
-        current_dir = os.path.dirname(__file__)
-        file_path = os.path.join(current_dir, "rag_docs", "wikidata_rag_demo.jsonl")
-        loader = JSONLoader(
-            file_path=file_path,
-            jq_schema=".",
-            text_content=False,
-            json_lines=True
-        )
-        wiki_docs = loader.load()
-        wiki_docs_processed = []
-        for doc in wiki_docs:
-            doc = json.loads(doc.page_content)
-            metadata = {
-                "id": doc["id"],
-                "title": doc["title"],
-                "source": "Wikipedia"
-            }
-            data = ' '.join(doc["paragraphs"])
-            wiki_docs_processed.append(Document(page_content=data, metadata=metadata))
-        return wiki_docs_processed
-    
-    def generate_chunk_context(self, document, chunk):
-        chunk_process_prompt = """
+    def checkpoint(bm25_index, bm25_path, manifest):
+        # the index is written before the manifest, so the manifest never lists chunks the saved index lacks;
+        # chunks upserted into Chroma after the last checkpoint are upserted again by a resumed job
+        bm25_index.save(bm25_path)
+        manifest.save()
+
+    @staticmethod
+    def iter_wiki_docs(file_path=None):
+        # parse each JSONL line once and yield documents lazily so memory stays flat
+        if file_path is None:
+            current_dir = os.path.dirname(__file__)
+            file_path = os.path.join(current_dir, "rag_docs", "wikidata_rag_demo.jsonl")
+        with open(file_path, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                metadata = {
+                    "id": record["id"],
+                    "title": record["title"],
+                    "source": "Wikipedia"
+                }
+                data = ' '.join(record["paragraphs"])
+                yield Document(page_content=data, metadata=metadata)
+
+    @staticmethod
+    def wiki_source(doc):
+        return f"wikipedia:{doc.metadata['id']}"
+
+    @staticmethod
+    def wiki_hash(doc):
+        return IngestionManifest.content_hash(doc.metadata["title"] + "\n" + doc.page_content)
+
+    def chunk_context_chain(self):
+        # The paper sits in the system message and the chunk comes last, so every
+        # call for the same paper starts with an identical prefix that the
+        # provider's prompt caching can reuse.
+        paper_prompt = """
         Act as a reserach paper analysis,
         Your task is to provide breif, relevant context for a chunk of text
         based on the following research paper.
 
+        - Give a short succinct context to situate the chunk given by the user within the overall document
+            for the purposes of improving search retrieval of the chunk.
+        - Answer only with the succinct context and nothing else.
+        - Context should be mentioned like 'Focuses on ....'
+        do not mention 'this chunk or section focuses on...'
+
         Here is the research paper:
         <paper>
         {paper}
         </paper>
-
+        """
+        chunk_prompt = """
         Here is the chunk we want to situate within the whole document:
         <chunk>
         {chunk}
         </chunk>
 
-        - Give a short succinct context to situate this chunk within the overall document
-            for the purposes of improving search retrieval of the chunk.
-        - Answer only with the succinct context and nothing else.
-        - Context should be mentioned like 'Focuses on ....'
-        do not mention 'this chunk or section focuses on...'
-
         Context:
         """
 
-        prompt_template = ChatPromptTemplate.from_template(chunk_process_prompt)
-        chunk_chain = prompt_template | self.llm | StrOutputParser()
-        context = chunk_chain.invoke({
+        prompt_template = ChatPromptTemplate.from_messages([
+            ("system", paper_prompt),
+            ("human", chunk_prompt)
+        ])
+        return prompt_template | self.retrying_llm()
+
+    def retrying_llm(self):
+        # back off and retry when the provider rate limits the parallel requests
+        return self.llm.with_retry(
+            retry_if_exception_type=(RateLimitError,),
+            wait_exponential_jitter=True,
+            stop_after_attempt=6
+        )
+
+    def generate_chunk_context(self, document, chunk):
+        return self.chunk_context_chain().invoke({
             'paper': document,
             'chunk': chunk
-        })
-        return context
-    
-    def create_contextual_chunks(self, file_path):
-        loader = PyMuPDFLoader(file_path)
+        }).content
+
+    def paper_for_context(self, original_doc, report=st.write):
+        doc_tokens = self.llm.get_num_tokens(original_doc)
+        if doc_tokens <= CONTEXT_DOC_TOKEN_BUDGET:
+            return original_doc
+        report(
+            f"Paper has {doc_tokens} tokens, above the {CONTEXT_DOC_TOKEN_BUDGET} token budget. "
+            "Using a hierarchical summary as the chunk context instead."
+        )
+        return self.hierarchical_summary(original_doc)
+
+    def hierarchical_summary(self, text):
+        summary_prompt = """
+        Act as a reserach paper analysis,
+        Summarize the following section of a research paper.
+        Keep the section titles, key methods, results and named entities
+        so that any passage from this section can still be situated in the paper.
+
+        Section:
+        {section}
+
+        Summary:
+        """
+        summary_chain = ChatPromptTemplate.from_template(summary_prompt) | self.retrying_llm() | StrOutputParser()
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CONTEXT_SUMMARY_SECTION_TOKENS,
+            chunk_overlap=0,
+            length_function=self.llm.get_num_tokens
+        )
+        # summarize sections, then summaries of summaries, until the paper fits the budget
+        while self.llm.get_num_tokens(text) > CONTEXT_DOC_TOKEN_BUDGET:
+            sections = splitter.split_text(text)
+            summaries = summary_chain.batch(
+                [{'section': section} for section in sections],
+                config={"max_concurrency": CONTEXT_MAX_CONCURRENCY}
+            )
+            text = '\n\n'.join(summaries)
+            if len(sections) == 1:
+                break
+        return text
+
+    def create_contextual_chunks(self, file_path, max_concurrency=CONTEXT_MAX_CONCURRENCY, job=None):
+        # chunk contexts and paper summaries yield to interactive requests sharing the rate limits
+        with RequestScheduler.priority(BATCH):
+            return self._create_contextual_chunks(file_path, max_concurrency, job)
+
+    def _create_contextual_chunks(self, file_path, max_concurrency, job):
+        report = job.log if job else st.caption
+        # the PDF loaders are only imported once a paper actually needs ingesting
+        document_loaders = ExerciseRegistry.dependency("langchain_community.document_loaders")
+        loader = document_loaders.PyMuPDFLoader(file_path)
         doc_pages = loader.load()
         splitter = RecursiveCharacterTextSplitter(chunk_size=3500, chunk_overlap=0)
         doc_chunks = splitter.split_documents(doc_pages)
-        
-        # Generating contextual chunks
-        contextual_chunks = []
+
         original_doc = '\n'.join([doc.page_content for doc in doc_pages])
-        for chunk in doc_chunks:
-            context = self.generate_chunk_context(document=original_doc, chunk=chunk)
+        paper = self.paper_for_context(original_doc, report=report)
+        chunk_chain = self.chunk_context_chain()
+        inputs = [{'paper': paper, 'chunk': chunk.page_content} for chunk in doc_chunks]
+
+        # contexts generated before an interruption are kept in the job checkpoint, per paper version
+        checkpoint_key = f"contexts:{IngestionManifest.content_hash(original_doc)}"
+        contexts = list(job.checkpoint.get(checkpoint_key, [])) if job else []
+        if contexts:
+            report(f"Reusing {len(contexts)} chunk contexts from the checkpoint")
+
+        # Generating contextual chunks. The first call writes the shared paper prefix
+        # into the provider's prompt cache, the rest then run with at most
+        # `max_concurrency` LLM calls in flight. batch() keeps the chunk order.
+        start = time.time()
+        responses = []
+        pending = inputs[len(contexts):]
+        if pending and not contexts:
+            responses.append(chunk_chain.invoke(pending[0]))
+            contexts.append(responses[-1].content)
+            pending = pending[1:]
+        for offset in range(0, len(pending), CONTEXT_CHECKPOINT_CHUNKS):
+            if job:
+                job.check_cancelled()
+            batch = chunk_chain.batch(
+                pending[offset:offset + CONTEXT_CHECKPOINT_CHUNKS],
+                config={"max_concurrency": max_concurrency}
+            )
+            responses.extend(batch)
+            contexts.extend(response.content for response in batch)
+            if job:
+                job.save_checkpoint({**job.checkpoint, checkpoint_key: contexts})
+                job.log(f"Generated context for {len(contexts)} of {len(inputs)} chunks")
+        elapsed = time.time() - start
+        if responses:
+            report(
+                f"⚡ {len(responses)} chunks in {elapsed:.1f}s "
+                f"({len(responses) / max(elapsed, 1e-6):.2f} chunks/sec, concurrency {max_concurrency})"
+            )
+            self.display_context_tokens(original_doc, doc_chunks[len(doc_chunks) - len(responses):], responses, report)
+
+        contextual_chunks = []
+        for chunk, context in zip(doc_chunks, contexts):
             contextual_chunks.append(
                 Document(
-                    page_content=context+"\n"+chunk.page_content, 
+                    page_content=context+"\n"+chunk.page_content,
                     metadata=chunk.metadata
                 )
             )
-        return contextual_chunks
\ No newline at end of file
+        return contextual_chunks
+
+    def display_context_tokens(self, original_doc, doc_chunks, responses, report=st.caption):
+        # before: the full paper was resent with every chunk
+        doc_tokens = self.llm.get_num_tokens(original_doc)
+        before = sum(doc_tokens + self.llm.get_num_tokens(chunk.page_content) for chunk in doc_chunks)
+        sent = cached = 0
+        for response in responses:
+            usage = response.usage_metadata or {}
+            sent += usage.get("input_tokens", 0)
+            cached += usage.get("input_token_details", {}).get("cache_read", 0) or 0
+        n = len(doc_chunks)
+        report(
+            f"🧮 Input tokens per chunk: ~{before // n} before (full paper per chunk) → "
+            f"{sent // n} sent, {cached // n} served from the prompt cache, "
+            f"{(sent - cached) // n} uncached"
+        )
@@ -4,7 +4,7 @@ import streamlit as st
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
+from llm.openai import LLM
 
 def run():
     if "analyst" not in st.session_state:
@@ -15,11 +15,7 @@ def run():
 class ResearchPapaerAnalyst:
     def __init__(self):
         self.messages = []
-        self.chatgpt = ChatOpenAI(
-            model_name="gpt-4", 
-            temperature=0.0,
-            openai_api_key=st.session_state.openai_api_key
-        )
+        self.chatgpt = LLM(cache=True).openai_chat("gpt-4", temperature=0.0)
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", self.sys_prompt),
             ("human", "{instruction}")
@@ -95,4 +91,6 @@ class ResearchPapaerAnalyst:
         self.messages.append(response)
         st.write(response.content)
         st.write(len(self.messages))
+        stats = LLM.cache_stats()
+        st.caption(f"🗄️ Response cache: {stats['hits']} hits / {stats['misses']} misses, {stats['saved_ms'] / 1000:.1f}s saved")
 
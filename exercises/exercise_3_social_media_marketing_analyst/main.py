@@ -8,7 +8,7 @@ def run():
 
 class SocialMediaMarketingAnalyst:
     def __init__(self):
-        self.openai = LLM().openai
+        self.openai = LLM(cache=True).openai
         
     def run(self):
         st.markdown(self.project())
@@ -123,4 +123,6 @@ class SocialMediaMarketingAnalyst:
         prompt = ChatPromptTemplate.from_template(prompt_txt)
         chain = prompt | self.openai
         response = chain.invoke({'fact_sheet_mobile': self.fact_sheet_contents})
-        st.write(response.content)
\ No newline at end of file
+        st.write(response.content)
+        stats = LLM.cache_stats()
+        st.caption(f"🗄️ Response cache: {stats['hits']} hits / {stats['misses']} misses, {stats['saved_ms'] / 1000:.1f}s saved")
\ No newline at end of file
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from langchain_core.prompts import PromptTemplate
 from llm.openai import LLM
+from llm.scheduler import BATCH, RequestScheduler
 from .it_support_response import ITSupportResponse
 from langchain_core.output_parsers import JsonOutputParser
 
@@ -45,7 +46,9 @@ class ITSupportAnalyst:
         )
         chain = prompt | self.llm | parser
         # response type list[Dict]
-        responses = chain.map().invoke(formatted_msgs)
+        # the fan-out waits behind interactive requests and within the provider's rate limits
+        with RequestScheduler.priority(BATCH):
+            responses = chain.map().invoke(formatted_msgs)
         df = pd.DataFrame(responses)
         st.dataframe(df, width=1000)
         # print(f"Output type {type(response)}")
@@ -11,6 +11,11 @@ from langchain.schema import SystemMessage, HumanMessage, AIMessage
 from langchain.schema.runnable import RunnablePassthrough, RunnableLambda
 from operator import itemgetter
 from langchain_groq import ChatGroq
+from utils.chroma_db import ChromaDB
+from utils.semantic_cache import SemanticCache
+
+# cosine similarity above which an opening question reuses an earlier answer
+SEMANTIC_CACHE_THRESHOLD = 0.95
 
 # class ConversationMemory:
 #     def run(self):
@@ -60,6 +65,13 @@ class ChatBot:
             elif isinstance(msg, AIMessage):
                 st.chat_message("assistant").write(msg.content)
 
+        # Near-duplicate opening questions from any user are answered from the semantic cache
+        cache = SemanticCache.shared("chatbot", embed_fn=ChromaDB.embeddings(), threshold=SEMANTIC_CACHE_THRESHOLD)
+        if st.session_state.get("chatbot_cache_entry") is not None:
+            if st.button("🗑️ Forget cached answer"):
+                cache.invalidate(st.session_state.chatbot_cache_entry)
+                st.session_state.chatbot_cache_entry = None
+
         # Handle user input
         user_input = st.chat_input("Type your message here...")
 
@@ -67,12 +79,23 @@ class ChatBot:
             st.chat_message("user").write(user_input)
 
             start = time.time()
-            response = chain.invoke({"input": user_input})
+            if st.session_state.memory.chat_memory.messages:
+                # later answers depend on this user's conversation, so they are neither shared nor reused
+                answer, entry = chain.invoke({"input": user_input}).content, None
+            else:
+                answer, entry = cache.get_or_compute(user_input, lambda: chain.invoke({"input": user_input}).content)
             end = time.time()
+            st.session_state.chatbot_cache_entry = entry["id"] if entry else None
 
             # Save context to memory
-            st.session_state.memory.save_context({"input": user_input}, {"output": response.content})
+            st.session_state.memory.save_context({"input": user_input}, {"output": answer})
 
             # Show AI response
-            st.chat_message("assistant").write(response.content)
-            st.caption(f"⏱️ Response time: {end - start:.2f}s")
\ No newline at end of file
+            st.chat_message("assistant").write(answer)
+            st.caption(f"⏱️ Response time: {end - start:.2f}s{' (semantic cache hit)' if entry else ''}")
+            stats = cache.stats()
+            st.caption(
+                f"🗄️ Semantic cache: {stats['hit_rate']:.0%} hit rate, "
+                f"hits p50/p95 {stats['hit_p50_ms']}/{stats['hit_p95_ms']} ms, "
+                f"misses p50/p95 {stats['miss_p50_ms']}/{stats['miss_p95_ms']} ms"
+            )
\ No newline at end of file
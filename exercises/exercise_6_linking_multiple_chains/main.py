@@ -1,4 +1,5 @@
 from llm.openai import LLM
+from llm.scheduler import BATCH, RequestScheduler
 import streamlit as st
 import pandas as pd
 from langchain_core.prompts import ChatPromptTemplate
@@ -33,7 +34,9 @@ class LinkingMultipleChains:
         if st.button("Analyze Tickets"):
             tickets = [ticket.strip() for ticket in user_input.split(",") if ticket.strip()]
             final_chain = self.detect_language() | self.translate_to_eng() | self.resolution_response_in_eng() | self.translate_response_to_src_lang()
-            response = final_chain.map().invoke([{'orig_msg': ticket} for ticket in tickets])
+            # four LLM calls per ticket, admitted as batch work within the provider's rate limits
+            with RequestScheduler.priority(BATCH):
+                response = final_chain.map().invoke([{'orig_msg': ticket} for ticket in tickets])
             st.dataframe(pd.DataFrame(response), use_container_width=True)
 
     # chain 1
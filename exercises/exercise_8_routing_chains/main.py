@@ -6,6 +6,7 @@ from operator import itemgetter
 from langchain_groq import ChatGroq
 from llm.openai import LLM
 from langchain_core.runnables import RunnableBranch
+from utils.resource_cache import ResourceCache
 
 def run():
     RoutingChains().run()
@@ -22,22 +23,29 @@ class RoutingChains:
             if review_input.strip() == "" or instruction.strip() == "":
                 st.warning("Please enter a review before clicking the button.")
             else:
-                branch = RunnableBranch(
-                    (lambda x: "summarize" in x["topic"].lower(), self.summary_chain()),
-                    (lambda x: "sentiment" in x["topic"].lower(), self.sentiment_chain()),
-                    (lambda x: "email" in x["topic"].lower(), self.email_chain()),
-                    self.default_answer,
+                # the routing chain is built once per LLM client, not on every click
+                full_chain = ResourceCache.get_or_build(
+                    "routing_chain", self.routing_chain, key=LLM.client_key(self.model), replace=False
                 )
-                full_chain = ({
-                    "topic": self.classifier_chain(),
-                    "instruction": lambda input_prompt: input_prompt.get("instruction"),
-                    "review": lambda input_prompt: input_prompt.get("review"),
-                    "sentiment": lambda input_prompt: self.sentiment_chain()
-
-                } | branch)
                 response = full_chain.invoke({'review': review_input, 'instruction': instruction})
                 st.write(response)
 
+    def routing_chain(self):
+        sentiment_chain = self.sentiment_chain()
+        branch = RunnableBranch(
+            (lambda x: "summarize" in x["topic"].lower(), self.summary_chain()),
+            (lambda x: "sentiment" in x["topic"].lower(), sentiment_chain),
+            (lambda x: "email" in x["topic"].lower(), self.email_chain()),
+            self.default_answer,
+        )
+        return ({
+            "topic": self.classifier_chain(),
+            "instruction": lambda input_prompt: input_prompt.get("instruction"),
+            "review": lambda input_prompt: input_prompt.get("review"),
+            "sentiment": lambda input_prompt: sentiment_chain
+
+        } | branch)
+
     def default_answer(query):
         return "Sorry instructions are not the defined intents"
 
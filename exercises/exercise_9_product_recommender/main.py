@@ -1,17 +1,71 @@
 from operator import itemgetter
 import re
+import threading
+import time
 from llm.openai import LLM
 import streamlit as st
-import pandas as pd
 from langchain_core.runnables import chain
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnableLambda
 from pathlib import Path
-from langchain_community.chat_message_histories import SQLChatMessageHistory
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.runnables import RunnableMap
+from langchain_core.runnables import RunnableBranch
+from langchain_core.tracers.run_collector import RunCollectorCallbackHandler
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.exceptions import OutputParserException
+from pydantic import ValidationError
+from utils.resource_cache import ResourceCache
+from utils.catalog_store import CatalogStore
+from utils.chat_history import WindowedChatHistory
+from utils.product_filter import FilterSpec, ProductFilter, RephrasedFilter
+from utils.product_table import ProductTableSerializer
+from utils.semantic_cache import percentile
+
+# user-AI exchanges kept as conversation memory
+MEMORY_WINDOW_TURNS = 10
+# products read from the catalog per query and ranked for the prompt, however many match
+MAX_CANDIDATE_ROWS = 500
+
+# "elided" skips the LLM calls a turn does not need, "sequential" always runs rephrase, filter and recommend
+PIPELINE_MODES = {"Skip unneeded LLM calls": "elided", "Rephrase, filter, recommend": "sequential"}
+# words that make a query lean on the conversation before it
+FOLLOW_UP_WORDS = frozenset(
+    "it its they them their those these that this one ones instead also too another else other others "
+    "same more less cheaper pricier better worse bigger smaller first second third last previous above".split()
+)
+FOLLOW_UP_OPENERS = ("and ", "what about", "how about", "but ", "or ")
+
+FILTER_INSTRUCTIONS = """
+            The schema of the product table is as follows:
+
+            Column        Dtype
+            ------        -----
+            Product_ID    object
+            Product_Name  object
+            Category      object
+            Price_USD     int64
+            Rating        float64
+            Description   object
+
+            Category has values: {categories}
+
+            Rating ranges from 1 - 5 in floats
+
+            You will try to figure out the filter focusing
+            only on Category, Price_USD and Rating if the user mentions
+            anything about these in their natural language query.
+            Do not select any products which do not meet the conditions provided in the user query.
+            Only use the category values above.
+            Set sort_by and limit only if the user asks for the cheapest, best rated or a number of products.
+            If not the filter spec should leave every field empty to return all products.
+"""
+
+# latency and LLM calls of every turn per pipeline mode, shared by all sessions
+_turn_stats = {mode: [] for mode in PIPELINE_MODES.values()}
+_turn_stats_lock = threading.Lock()
 
 def run():
     ProductRecommender().run()
@@ -21,15 +75,37 @@ class ProductRecommender:
         self.model = LLM().chat_groq
         current_dir = Path(__file__).parent
         csv_path = current_dir / "Ecommerce_Product_List.csv"
-        self.df = pd.read_csv(csv_path)
+        # the columnar store is built once per file version and memory-mapped afterwards
+        self.product_filter = ResourceCache.get_or_build(
+            "product_filter",
+            lambda: ProductFilter(CatalogStore.open_or_build(str(csv_path))),
+            key=(str(csv_path), csv_path.stat().st_mtime)
+        )
         
     def run(self):
         user_name = st.text_input('Username')
+        mode = st.radio("Pipeline", list(PIPELINE_MODES), horizontal=True)
         user_query = st.chat_input("Ask something...")
         if user_name and user_query:
-            self.chat_with_llm(prompt=user_query, session_id=user_name)
+            self.chat_with_llm(prompt=user_query, session_id=user_name, mode=PIPELINE_MODES[mode])
+            st.caption(" · ".join(
+                f"{name}: p50 {stats['p50_ms']} ms, {stats['llm_calls']} LLM calls per turn over {stats['turns']} turns"
+                for name, stats in self.turn_stats().items() if stats["turns"]
+            ))
 
-    def chat_with_llm(self, prompt: str, session_id: str):
+    def chat_with_llm(self, prompt: str, session_id: str, mode: str = "elided"):
+        if mode == "sequential":
+            product_table_chain = (
+                self.repharse_query_chain()
+                | RunnableLambda(lambda query: {"user_query": query})
+                | self.text_to_filter_chain()
+            )
+        else:
+            # first turns and self-contained queries need no rephrasing, the others get it fused into the filter call
+            product_table_chain = RunnableBranch(
+                (lambda x: not x["history"] or self.is_standalone(x["user_query"]), self.cached_filter_chain()),
+                self.rephrase_and_filter_chain()
+            )
         combined_chain = (
             RunnableLambda(lambda x: {
                 "user_query": x["human_input"],
@@ -39,9 +115,7 @@ class ProductRecommender:
                 history=lambda x: self.memory_buffer_window(x["history"]),
                 human_input=lambda x: x["user_query"]
             )
-            | self.repharse_query_chain()
-            | RunnableLambda(lambda query: {"user_query": query})
-            | self.text_to_pandas_chain()
+            | product_table_chain
             | RunnableLambda(lambda table: {
                 "product_table": table,
                 "user_query": prompt
@@ -56,15 +130,48 @@ class ProductRecommender:
             history_messages_key="history",
         )
 
+        # passed as a callback rather than collect_runs(), which would hide the runs from an outer collector
+        collector = RunCollectorCallbackHandler()
+        start = time.perf_counter()
         response = conv_chain.invoke(
             {"human_input": prompt},
-            config={'configurable': {'session_id': session_id}}
+            config={'configurable': {'session_id': session_id}, 'callbacks': [collector]}
         )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        llm_calls = LLM.count_calls(collector.traced_runs)
+        with _turn_stats_lock:
+            _turn_stats[mode].append((elapsed_ms, llm_calls))
 
         st.chat_message(name="system").markdown(response)
+        st.caption(f"{llm_calls} LLM calls, {elapsed_ms:.0f} ms this turn")
+
+    @staticmethod
+    def turn_stats() -> dict:
+        with _turn_stats_lock:
+            turns = {mode: list(values) for mode, values in _turn_stats.items()}
+        return {
+            mode: {
+                "turns": len(values),
+                "p50_ms": round(percentile([elapsed for elapsed, _ in values], 50)),
+                "llm_calls": round(sum(calls for _, calls in values) / len(values), 2) if values else 0.0,
+            }
+            for mode, values in turns.items()
+        }
+
+    def is_standalone(self, query: str) -> bool:
+        """
+        Cheap local check for queries that need no history: no follow-up wording
+        and a product category of their own.
+        """
+        text = query.lower().strip()
+        words = re.findall(r"[a-z]+", text)
+        if text.startswith(FOLLOW_UP_OPENERS) or any(word in FOLLOW_UP_WORDS for word in words):
+            return False
+        return any(category.lower() in text for category in self.product_filter.categories)
 
     def get_sesssion_history_db(self, session_id):
-        return SQLChatMessageHistory(session_id, "sqlite:///memory.db")
+        # only the window memory_buffer_window keeps is read, through one shared engine
+        return WindowedChatHistory(session_id, window=2 * MEMORY_WINDOW_TURNS)
 
     def repharse_query_chain(self):
         sys_prompt = """You are a retail product expert.
@@ -89,64 +196,122 @@ class ProductRecommender:
         )
 
     # create a memory buffer window function to return the last K conversations
-    def memory_buffer_window(self, messages, k=10): # 10 here means retrieve only last 2*10 user-AI conversations
+    def memory_buffer_window(self, messages, k=MEMORY_WINDOW_TURNS): # 10 here means retrieve only last 2*10 user-AI conversations
         return messages[-(2*k):]
 
-    def execute_pandas_query(self, query):
-        st.write("Running query:", query)
+    def parse_filter_spec(self, output) -> FilterSpec:
+        return FilterSpec.model_validate(JsonOutputParser(pydantic_object=FilterSpec).parse(output))
+
+    def run_filter(self, output, user_query, cache_query=None):
         try:
-            # clean_query = self.sanitize_query(query)
-            result_df = eval(query)  # Safe context
-            return result_df.to_markdown()
-        except Exception as e:
-            return f"❌ Error evaluating query:\n```{e}```"
+            spec = self.parse_filter_spec(output)
+        except (OutputParserException, ValidationError) as e:
+            return f"❌ Invalid filter spec:\n```{e}```"
+        if cache_query is not None:
+            self.product_filter.cache_spec(cache_query, spec)
+        return self.execute_filter_spec(spec, user_query)
 
+    def execute_filter_spec(self, spec: FilterSpec, user_query):
+        st.write("Running filter:", spec.model_dump(exclude_defaults=True))
+        matched = len(self.product_filter.positions(spec))
+        # broad matches are cut to the best rated candidates before ranking
+        candidates = spec.model_copy(update={
+            "limit": min(spec.limit or MAX_CANDIDATE_ROWS, MAX_CANDIDATE_ROWS),
+            **({} if spec.sort_by else {"sort_by": "rating", "descending": True})
+        })
+        result_df = self.product_filter.apply(candidates)
+        stats = self.product_filter.stats()
+        table, report = ProductTableSerializer().serialize(
+            result_df, user_query, ranked=spec.sort_by is not None, matched=matched
+        )
+        st.caption(
+            f"Filtered {stats['rows']} products to {matched} in {stats['last_filter_ms']} ms · "
+            f"{report['rows']} rows in the prompt, {report['tokens']} tokens "
+            f"({report['tokens_saved']} saved vs. markdown)"
+        )
+        return table
 
-    def text_to_pandas_chain(self):
+    def filter_spec_chain(self):
         FILTER_PROMPT = """
-            ⚠️ STRICT: Return ONLY the pandas query using `self.df`. No explanation. No markdown. Your output MUST start with `self.df`.
+            ⚠️ STRICT: Return ONLY the product filter spec as JSON. No explanation. No markdown.
 
-            Given the following schema of a dataframe table,
-            your task is to figure out the best pandas query to
-            filter the dataframe based on the user query which
-            will be in natural language.
+            Given the following schema of a product table,
+            your task is to figure out the product filter spec
+            that selects the products matching the user query
+            which will be in natural language.
+            """ + FILTER_INSTRUCTIONS + """
+            Output format instructions:
+            {format_instructions}
 
-            The schema is as follows:
+            User Query: {user_query}
+        """
+        parser = JsonOutputParser(pydantic_object=FilterSpec)
+        filter_prompt_template = ChatPromptTemplate.from_template(FILTER_PROMPT).partial(
+            categories=str(self.product_filter.categories),
+            format_instructions=parser.get_format_instructions()
+        )
+        return filter_prompt_template | self.model | StrOutputParser() | RunnableLambda(self.debug_output)
 
-            #   Column        Non-Null Count  Dtype
-            ---  ------        --------------  -----
-            0   Product_ID    30 non-null     object
-            1   Product_Name  30 non-null     object
-            2   Category      30 non-null     object
-            3   Price_USD     30 non-null     int64
-            4   Rating        30 non-null     float64
-            5   Description   30 non-null     object
+    def text_to_filter_chain(self):
+        return (
+            RunnablePassthrough.assign(spec=self.filter_spec_chain())
+            | RunnableLambda(lambda x: self.run_filter(x["spec"], x["user_query"]))
+        )
 
-            Category has values: ['Laptop', 'Tablet', 'Smartphone',
-                                  'Smartwatch', 'Camera',
-                                  'Headphones', 'Mouse', 'Keyboard',
-                                  'Monitor', 'Charger']
+    def cached_filter_chain(self):
+        def filter_table(x):
+            spec = self.product_filter.cached_spec(x["user_query"])
+            if spec is not None:
+                st.caption("♻️ Reused the filter spec of an earlier identical query")
+                return self.execute_filter_spec(spec, x["user_query"])
+            output = self.filter_spec_chain().invoke({"user_query": x["user_query"]})
+            return self.run_filter(output, x["user_query"], cache_query=x["user_query"])
+        return RunnableLambda(filter_table)
 
-            Rating ranges from 1 - 5 in floats
+    def rephrase_and_filter_chain(self):
+        sys_prompt = """You are a retail product expert.
+                Carefully analyze the following conversation history
+                and the current user query.
+                Refer to the history and rephrase the current user query
+                into a standalone query which can be used without the history
+                for making search queries.
+                Rephrase only if needed.
+                Then figure out the product filter spec that selects
+                the products matching the standalone query.
+                """ + FILTER_INSTRUCTIONS + """
+                ⚠️ STRICT: Return ONLY the standalone query and product filter spec as JSON. No explanation. No markdown.
+
+                Output format instructions:
+                {format_instructions}
+            """
+        parser = JsonOutputParser(pydantic_object=RephrasedFilter)
+        prompt_template = ChatPromptTemplate.from_messages([
+            ("system", sys_prompt),
+            MessagesPlaceholder(variable_name="history"),
+            ("human", """Current User Query: {human_input}""")
+        ]).partial(
+            categories=str(self.product_filter.categories),
+            format_instructions=parser.get_format_instructions()
+        )
+
+        def filter_table(output):
+            try:
+                rephrased = RephrasedFilter.model_validate(parser.parse(output))
+            except (OutputParserException, ValidationError) as e:
+                return f"❌ Invalid filter spec:\n```{e}```"
+            st.write("Standalone query:", rephrased.query)
+            # a later turn asking the same standalone query skips the filter call
+            self.product_filter.cache_spec(rephrased.query, rephrased.filter)
+            return self.execute_filter_spec(rephrased.filter, rephrased.query)
 
-            You will try to figure out the pandas query focusing
-            only on Category, Price_USD and Rating if the user mentions
-            anything about these in their natural language query.
-            Do not display any rows which dose not meet the conditions provided in the below user query.
-            Do not make up column names, only use the above.
-            If not the pandas query should just return the full dataframe.
-          
-            User Query: {user_query}
-        """
-        filter_prompt_template = ChatPromptTemplate.from_template(FILTER_PROMPT)
         return (
-            filter_prompt_template 
-            | self.model 
+            prompt_template
+            | self.model
             | StrOutputParser()
             | RunnableLambda(self.debug_output)
-            | RunnableLambda(lambda query: self.execute_pandas_query(query))
+            | RunnableLambda(filter_table)
         )
-    
+
     def product_description_chain(self):
         RECOMMEND_PROMPT = """
             Act as an expert retail product advisor
@@ -165,7 +330,7 @@ class ProductRecommender:
             In case the user query is just a generic query or greeting
             respond to them appropriately without recommending any products
 
-            Product Table:
+            Product Table (one product per line, fields separated by |):
             {product_table}
 
             User Query:
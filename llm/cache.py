@@ -0,0 +1,140 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+# misses waiting for their response, beyond which the oldest are forgotten
+MAX_PENDING_MISSES = 1024
+# a miss not answered within the HTTP client timeout has failed and will never be updated
+PENDING_MISS_EXPIRY_S = 600
+
+
+class SQLiteResponseCache(BaseCache):
+    """
+    Persistent exact-match cache for chat model responses.
+
+    Entries are keyed by the model string (model name and parameters) and
+    the serialized messages, stored in SQLite, expire after `ttl_seconds`
+    and are evicted least recently used first above `max_entries`.
+    The time a miss took to answer is stored with the entry, so every
+    later hit adds it to the saved latency.
+    """
+
+    def __init__(self, db_path: str = "./llm_cache.db", max_entries: int = 10_000, ttl_seconds: float = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._pending = OrderedDict()  # key -> start times of its missed lookups, oldest first
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                latency_ms REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, latency_ms, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[2] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                self._add_pending(key)
+                return None
+            self.hits += 1
+            self.saved_ms += row[1]
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        generations = [loads(generation) for generation in json.loads(row[0])]
+        for generation in generations:
+            # lets callbacks tell cached responses from fresh ones
+            message = getattr(generation, "message", None)
+            if message is not None:
+                message.response_metadata["cache_hit"] = True
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            started = self._pop_pending(key)
+            latency_ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, latency_ms, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps([dumps(generation) for generation in return_val]), latency_ms, now, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def _add_pending(self, key: str) -> None:
+        now = time.perf_counter()
+        # concurrent misses on the same prompt each keep their own start time
+        self._pending.setdefault(key, deque()).append(now)
+        self._pending.move_to_end(key)
+        # calls that raised after their miss are never updated, so their entries expire
+        while self._pending:
+            oldest_key, starts = next(iter(self._pending.items()))
+            if len(self._pending) <= MAX_PENDING_MISSES and now - starts[-1] < PENDING_MISS_EXPIRY_S:
+                break
+            del self._pending[oldest_key]
+
+    def _pop_pending(self, key: str) -> Optional[float]:
+        starts = self._pending.get(key)
+        if not starts:
+            return None
+        started = starts.popleft()
+        if not starts:
+            del self._pending[key]
+        return started
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "saved_ms": round(self.saved_ms, 1),
+                "entries": entries,
+            }
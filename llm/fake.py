@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from llm.scheduler import scheduler
+from utils.semantic_cache import hashing_embedding
+
+
+def fake_backend_enabled() -> bool:
+    # LLM_BACKEND=fake swaps every chat model and embedding model for the offline fakes below
+    return os.environ.get("LLM_BACKEND", "").lower() == "fake"
+
+
+def fake_latency_s() -> float:
+    return float(os.environ.get("FAKE_LLM_LATENCY_MS", "0")) / 1000
+
+
+def fake_tokens_per_second() -> float:
+    return float(os.environ.get("FAKE_LLM_TOKENS_PER_SEC", "0"))
+
+
+def fake_rate_limits() -> tuple:
+    # requests and tokens per minute, 0 for no limit
+    return float(os.environ.get("FAKE_LLM_RPM", "0")), float(os.environ.get("FAKE_LLM_TPM", "0"))
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def example_from_schema(schema: dict, defs: dict, name: str = "value") -> Any:
+    """
+    Builds a deterministic instance of a JSON schema, as emitted in LangChain's
+    output parser format instructions.
+    """
+    if "$ref" in schema:
+        return example_from_schema(defs[schema["$ref"].split("/")[-1]], defs, name)
+    if "default" in schema:
+        return schema["default"]
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return example_from_schema(options[0], defs, name) if options else None
+    schema_type = schema.get("type", "object")
+    if schema_type == "object":
+        return {
+            key: example_from_schema(value, defs, key)
+            for key, value in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        return [example_from_schema(schema.get("items", {}), defs, name)]
+    if schema_type == "boolean":
+        return False
+    if schema_type == "integer":
+        return 0
+    if schema_type == "number":
+        return 0.0
+    return f"fake {name}"
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model that returns deterministic canned responses.
+
+    Structured prompts get valid output: JSON matching the schema in the
+    format instructions, document judgements for the batched compressor and
+    filter specs for the product recommender. Anything else gets a stable
+    text derived from the prompt. `latency_s` and `tokens_per_second`
+    simulate a provider's time to first token and generation speed, and
+    requests pass the rate limit scheduler like real provider calls.
+    """
+
+    model_name: str = "fake"
+    latency_s: float = 0.0
+    tokens_per_second: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name}
+
+    def get_num_tokens(self, text: str) -> int:
+        # the default tokenizer needs transformers or a tiktoken download
+        return estimate_tokens(text)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = self.respond(prompt)
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(text)
+        scheduler.acquire("fake", self.model_name, input_tokens + output_tokens)
+        delay = self.latency_s + (output_tokens / self.tokens_per_second if self.tokens_per_second else 0.0)
+        if delay:
+            time.sleep(delay)
+        message = AIMessage(
+            content=text,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def respond(self, prompt: str) -> str:
+        if "<document index=" in prompt:
+            return self.document_judgements(prompt)
+        # carries a schema too, but needs a spec matching the query rather than the defaults
+        if "standalone query and product filter spec" in prompt:
+            return self.rephrased_filter(prompt)
+        if "product filter spec" in prompt:
+            return self.product_filter_spec(prompt)
+        if "Here is the output schema:" in prompt:
+            return self.schema_instance(prompt)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        last_line = next((line.strip() for line in reversed(prompt.splitlines()) if line.strip()), "")
+        return f"Fake response {digest} to: {last_line[:200]}"
+
+    @staticmethod
+    def schema_instance(prompt: str) -> str:
+        match = re.search(r"Here is the output schema:\s*```(?:json)?\s*(.*?)```", prompt, re.S)
+        schema = json.loads(match.group(1)) if match else {}
+        return json.dumps(example_from_schema(schema, schema.get("$defs", {})))
+
+    @staticmethod
+    def document_judgements(prompt: str) -> str:
+        documents = re.findall(r"<document index=(\d+)>\n(.*?)\n</document>", prompt, re.S)
+        return json.dumps({
+            "documents": [
+                {"index": int(index), "relevant": True, "extract": content[:300]}
+                for index, content in documents
+            ]
+        })
+
+    @staticmethod
+    def product_filter_spec(prompt: str) -> str:
+        query = prompt.rsplit("User Query:", 1)[-1].lower()
+        categories_match = re.search(r"Category has values:\s*\[(.*?)\]", prompt, re.S)
+        categories = re.findall(r"'([^']+)'", categories_match.group(1)) if categories_match else []
+        spec = {"categories": [category for category in categories if category.lower() in query][:1]}
+        price = re.search(r"(?:under|below|less than|cheaper than|max)\s*\$?\s*(\d+)", query)
+        if price:
+            spec["max_price"] = float(price.group(1))
+        rating = re.search(r"rat(?:ing|ed)\D{0,20}(\d(?:\.\d)?)", query)
+        if rating:
+            spec["min_rating"] = float(rating.group(1))
+        if "cheapest" in query:
+            spec.update(sort_by="price", descending=False)
+        elif "best rated" in query or "top rated" in query:
+            spec.update(sort_by="rating", descending=True)
+        limit = re.search(r"\b(?:top|first|show me)\s+(\d+)\b", query)
+        if limit:
+            spec["limit"] = int(limit.group(1))
+        return json.dumps(spec)
+
+    @staticmethod
+    def rephrased_filter(prompt: str) -> str:
+        head, query = prompt.rsplit("Current User Query:", 1)
+        query = query.strip()
+        categories_match = re.search(r"Category has values:\s*\[(.*?)\]", head, re.S)
+        categories = re.findall(r"'([^']+)'", categories_match.group(1)) if categories_match else []
+        # a follow-up without a category of its own is about the last one the conversation mentioned
+        conversation = head.rsplit("Output format instructions:", 1)[-1].lower()
+        if not any(category.lower() in query.lower() for category in categories):
+            mentioned = [(conversation.rfind(category.lower()), category) for category in categories]
+            position, category = max(mentioned, default=(-1, None))
+            if position >= 0:
+                query = f"{category} {query}"
+        spec = FakeChatModel.product_filter_spec(f"{head}User Query: {query}")
+        return json.dumps({"query": query, "filter": json.loads(spec)})
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Offline embeddings from hashed word features, deterministic across runs.
+    """
+
+    def __init__(self, dim: int = 512, latency_s: float = 0.0):
+        self.dim = dim
+        self.latency_s = latency_s
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return hashing_embedding(texts, dim=self.dim)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
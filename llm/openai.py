@@ -1,27 +1,221 @@
 from functools import cached_property
+import hashlib
+import json
+import threading
+import time
+import weakref
+import httpx
 from langchain_openai import ChatOpenAI
 import streamlit as st
 from langchain_groq import ChatGroq
+from llm.cache import SQLiteResponseCache
+from llm.fake import FakeChatModel, fake_backend_enabled, fake_latency_s, fake_tokens_per_second, fake_rate_limits
+from llm.scheduler import DEFAULT_COMPLETION_TOKENS, scheduler
+
+# providers whose requests are admitted through the rate limit scheduler, by API host
+PROVIDER_HOSTS = {"api.openai.com": "openai", "api.groq.com": "groq"}
+
+
+def _estimate_request_tokens(body: dict) -> int:
+    # prompt characters / 4 plus the completion budget, the unit providers count against the limit
+    prompt_chars = len(json.dumps(body.get("messages", [])))
+    completion = body.get("max_completion_tokens") or body.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return prompt_chars // 4 + completion
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """
+    Keep-alive HTTP transport shared by every chat model client.
+
+    Counts requests and the distinct connections they ran on, so connection
+    reuse and the latency of new vs reused connections can be read from
+    `LLM.stats()`. Requests to known providers wait for the rate limit
+    scheduler first, and their responses' rate limit headers are fed back
+    to it.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = 0
+        self.new_connection_ms = []
+        self.reused_connection_ms = []
+        # streams of the connections seen so far, forgotten once a closed connection is collected
+        self._connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        provider = PROVIDER_HOSTS.get(request.url.host)
+        if provider is not None:
+            body = json.loads(request.content or b"{}")
+            model = body.get("model", "")
+            scheduler.acquire(provider, model, _estimate_request_tokens(body))
+        start = time.perf_counter()
+        response = super().handle_request(request)
+        if provider is not None:
+            scheduler.record_response(provider, model, response.status_code, response.headers)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        # one network stream per pooled connection
+        connection = response.extensions.get("network_stream")
+        with self._lock:
+            self.requests += 1
+            if connection is not None and connection in self._connections:
+                self.reused_connection_ms.append(elapsed_ms)
+            else:
+                if connection is not None:
+                    self._connections.add(connection)
+                self.new_connection_ms.append(elapsed_ms)
+        return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            new, reused = self.new_connection_ms, self.reused_connection_ms
+            return {
+                "requests": self.requests,
+                "connections_opened": len(new),
+                "reused_requests": len(reused),
+                "avg_new_connection_ms": round(sum(new) / len(new), 1) if new else 0.0,
+                "avg_reused_connection_ms": round(sum(reused) / len(reused), 1) if reused else 0.0,
+            }
+
+
+_transport = PooledTransport(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=120)
+)
+_http_client = httpx.Client(transport=_transport, timeout=httpx.Timeout(600.0, connect=10.0))
+
+# exact-match response cache shared by every client created with LLM(cache=True)
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+# process-wide chat model clients keyed by (provider, model, temperature, api key fingerprint, cache)
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _fingerprint(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def _cache_for(temperature: float):
+    global _response_cache
+    # sampled responses are not reproducible, so only deterministic calls are cached
+    if temperature > 0:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = SQLiteResponseCache()
+        return _response_cache
+
+
+def _client(key: tuple, factory):
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
 
 class LLM:
+    def __init__(self, cache: bool = False):
+        # cache=True serves repeated temperature 0 requests from the local response cache
+        self.cache = cache
+
     @cached_property
     def openai(self):
-        return ChatOpenAI(
-            model_name="gpt-3.5-turbo",
-            temperature=0.0,
-            openai_api_key=st.session_state.openai_api_key
-        )
-    
+        return self.openai_chat("gpt-3.5-turbo", temperature=0.0)
+
     def openai_gpt4o(self, temperature = 0.0):
-        return ChatOpenAI(
-            model_name="gpt-4o",
-            temperature=temperature,
-            openai_api_key=st.session_state.openai_api_key
+        return self.openai_chat("gpt-4o", temperature=temperature)
+
+    def openai_chat(self, model_name: str, temperature: float = 0.0):
+        if fake_backend_enabled():
+            return self.fake_chat(model_name, temperature)
+        api_key = st.session_state.openai_api_key
+        cache = _cache_for(temperature) if self.cache else None
+        return _client(
+            ("openai", model_name, temperature, _fingerprint(api_key), cache is not None),
+            lambda: ChatOpenAI(
+                model_name=model_name,
+                temperature=temperature,
+                openai_api_key=api_key,
+                http_client=_http_client,
+                cache=cache
+            )
         )
-    
+
     @cached_property
     def chat_groq(self):
-        return ChatGroq(
-            api_key=st.session_state.groq_api_key,
-            model_name="llama3-8b-8192"
+        return self.groq_chat("llama3-8b-8192")
+
+    def groq_chat(self, model_name: str, temperature: float = 0.7):
+        if fake_backend_enabled():
+            return self.fake_chat(model_name, temperature)
+        api_key = st.session_state.groq_api_key
+        cache = _cache_for(temperature) if self.cache else None
+        return _client(
+            ("groq", model_name, temperature, _fingerprint(api_key), cache is not None),
+            lambda: ChatGroq(
+                api_key=api_key,
+                model_name=model_name,
+                temperature=temperature,
+                http_client=_http_client,
+                cache=cache
+            )
+        )
+
+    def fake_chat(self, model_name: str, temperature: float = 0.0):
+        cache = _cache_for(temperature) if self.cache else None
+        latency_s, tokens_per_second = fake_latency_s(), fake_tokens_per_second()
+        # FAKE_LLM_RPM / FAKE_LLM_TPM simulate provider rate limits offline
+        scheduler.configure("fake", *fake_rate_limits())
+        return _client(
+            ("fake", model_name, temperature, latency_s, tokens_per_second, cache is not None),
+            lambda: FakeChatModel(
+                model_name=model_name,
+                latency_s=latency_s,
+                tokens_per_second=tokens_per_second,
+                cache=cache
+            )
         )
+
+    @staticmethod
+    def client_key(llm) -> tuple:
+        """
+        Identifies a chat model by its configuration rather than its id(), for
+        caches of chains and outputs built around a client.
+        """
+        with _clients_lock:
+            for key, client in _clients.items():
+                if client is llm:
+                    return key
+        return (type(llm).__name__, getattr(llm, "model_name", None), getattr(llm, "temperature", None))
+
+    @staticmethod
+    def count_calls(runs) -> int:
+        """
+        Counts the LLM and chat model calls in traced run trees, e.g. from `collect_runs()`.
+        """
+        calls = 0
+        stack = list(runs)
+        while stack:
+            run = stack.pop()
+            stack.extend(run.child_runs)
+            calls += run.run_type in ("llm", "chat_model")
+        return calls
+
+    @staticmethod
+    def stats() -> dict:
+        with _clients_lock:
+            clients = len(_clients)
+        return {"clients": clients, **_transport.stats()}
+
+    @staticmethod
+    def scheduler_stats() -> list[dict]:
+        return scheduler.stats()
+
+    @staticmethod
+    def cache_stats() -> dict:
+        with _response_cache_lock:
+            cache = _response_cache
+        if cache is None:
+            return {"hits": 0, "misses": 0, "hit_ratio": 0.0, "saved_ms": 0.0, "entries": 0}
+        return cache.stats()
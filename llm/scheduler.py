@@ -0,0 +1,223 @@
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# follows the caller into LangChain's executor threads, which copy the context
+_priority: ContextVar[int] = ContextVar("request_priority", default=INTERACTIVE)
+
+# (requests per minute, tokens per minute) assumed until the provider's headers say otherwise
+DEFAULT_LIMITS = {
+    "openai": (500, 30_000),
+    "groq": (30, 6_000),
+}
+# completion tokens reserved for a request that does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 256
+MAX_BACKOFF_S = 60.0
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parses rate limit reset durations such as "1s", "6m0s", "20ms" or "0.5" into seconds.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    return sum(float(amount) * units[unit] for amount, unit in parts) if parts else None
+
+
+class TokenBucket:
+    """
+    Bucket holding up to `per_minute` units, refilled continuously at `per_minute / 60` per second.
+    """
+
+    def __init__(self, per_minute: Optional[float]):
+        self.set_limit(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def set_limit(self, per_minute: Optional[float]) -> None:
+        # no limit configured means the bucket never runs dry
+        self.capacity = float(per_minute) if per_minute else float("inf")
+        self.rate = self.capacity / 60
+        if hasattr(self, "level"):
+            self.level = min(self.level, self.capacity)
+
+    def _refill(self, now: float) -> None:
+        if self.capacity != float("inf"):
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def drain_to(self, remaining: float, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+
+class _ModelState:
+    def __init__(self, limits: tuple):
+        self.requests = TokenBucket(limits[0])
+        self.tokens = TokenBucket(limits[1])
+        self.waiting = []  # heap of (priority, sequence)
+        self.blocked_until = 0.0
+        self.consecutive_limited = 0
+        self.sent = 0
+        self.throttled = 0
+        self.throttle_s = 0.0
+        self.max_throttle_s = 0.0
+        self.rate_limited = 0
+
+
+class RequestScheduler:
+    """
+    Central admission control for LLM requests, per provider and model.
+
+    Every request waits for both a request and an estimated-token budget
+    from the model's token buckets. Waiting requests are admitted
+    interactive first, then batch, in arrival order within a priority.
+    Rate limit headers on responses adapt the buckets to the account's real
+    limits and remaining budget. A 429 pauses the model until `retry-after`,
+    or for an exponential backoff when the header is missing, so concurrent
+    retries do not pile onto the provider.
+    """
+
+    def __init__(self, limits: dict = DEFAULT_LIMITS):
+        self.limits = dict(limits)
+        self._models = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    @staticmethod
+    @contextmanager
+    def priority(level: int):
+        token = _priority.set(level)
+        try:
+            yield
+        finally:
+            _priority.reset(token)
+
+    def configure(self, provider: str, requests_per_minute: Optional[float], tokens_per_minute: Optional[float]) -> None:
+        with self._condition:
+            self.limits[provider] = (requests_per_minute, tokens_per_minute)
+            for (state_provider, _), state in self._models.items():
+                if state_provider == provider:
+                    state.requests.set_limit(requests_per_minute)
+                    state.tokens.set_limit(tokens_per_minute)
+            self._condition.notify_all()
+
+    def _state(self, provider: str, model: str) -> _ModelState:
+        key = (provider, model)
+        if key not in self._models:
+            self._models[key] = _ModelState(self.limits.get(provider, (None, None)))
+        return self._models[key]
+
+    def acquire(self, provider: str, model: str, tokens: int) -> float:
+        """
+        Blocks until the model has budget for one request of `tokens` estimated tokens.
+
+        Returns:
+            float: Seconds the request was throttled.
+        """
+        start = time.monotonic()
+        with self._condition:
+            state = self._state(provider, model)
+            ticket = (_priority.get(), next(self._sequence))
+            heapq.heappush(state.waiting, ticket)
+            while True:
+                now = time.monotonic()
+                if state.waiting[0] == ticket:
+                    wait = max(
+                        state.blocked_until - now,
+                        state.requests.wait_time(1, now),
+                        state.tokens.wait_time(tokens, now)
+                    )
+                    if wait <= 0:
+                        heapq.heappop(state.waiting)
+                        state.requests.take(1, now)
+                        state.tokens.take(tokens, now)
+                        break
+                    self._condition.wait(timeout=wait)
+                else:
+                    self._condition.wait()
+            throttled = time.monotonic() - start
+            state.sent += 1
+            if throttled > 0.001:
+                state.throttled += 1
+                state.throttle_s += throttled
+                state.max_throttle_s = max(state.max_throttle_s, throttled)
+            # the next request in line may be admissible right away
+            self._condition.notify_all()
+        return throttled
+
+    def record_response(self, provider: str, model: str, status_code: int, headers) -> None:
+        now = time.monotonic()
+        with self._condition:
+            state = self._state(provider, model)
+            token_limit = headers.get("x-ratelimit-limit-tokens")
+            if token_limit:
+                state.tokens.set_limit(float(token_limit))
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens is not None:
+                state.tokens.drain_to(float(remaining_tokens), now)
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            if remaining_requests is not None and float(remaining_requests) < 1:
+                reset = parse_duration(headers.get("x-ratelimit-reset-requests")) or 1.0
+                state.blocked_until = max(state.blocked_until, now + reset)
+
+            if status_code == 429:
+                state.rate_limited += 1
+                state.consecutive_limited += 1
+                retry_after = parse_duration(headers.get("retry-after-ms"))
+                retry_after = retry_after / 1000 if retry_after is not None else parse_duration(headers.get("retry-after"))
+                if retry_after is None:
+                    backoff = min(MAX_BACKOFF_S, 0.5 * 2 ** state.consecutive_limited)
+                    retry_after = backoff * random.uniform(0.5, 1.0)
+                state.blocked_until = max(state.blocked_until, now + retry_after)
+            elif status_code < 400:
+                state.consecutive_limited = 0
+            self._condition.notify_all()
+
+    def stats(self) -> list[dict]:
+        with self._condition:
+            rows = []
+            for (provider, model), state in self._models.items():
+                waiting = [priority for priority, _ in state.waiting]
+                rows.append({
+                    "provider": provider,
+                    "model": model,
+                    "queue_depth": len(waiting),
+                    **{f"waiting_{name}": waiting.count(level) for level, name in PRIORITY_NAMES.items()},
+                    "requests": state.sent,
+                    "throttled": state.throttled,
+                    "throttle_ms": round(state.throttle_s * 1000, 1),
+                    "max_throttle_ms": round(state.max_throttle_s * 1000, 1),
+                    "rate_limited": state.rate_limited,
+                    "blocked_for_ms": round(max(0.0, state.blocked_until - time.monotonic()) * 1000, 1),
+                })
+            return rows
+
+
+# one scheduler for every client in the process
+scheduler = RequestScheduler()
@@ -0,0 +1,137 @@
+from typing import Literal, Optional, Sequence
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import PromptTemplate
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+# unreadable answers, as opposed to provider errors (auth, network, rate limits) which are raised
+PARSE_ERRORS = (OutputParserException, ValidationError)
+
+
+class DocumentJudgement(BaseModel):
+    index: int = Field(description="Index of the document as given in the input")
+    relevant: bool = Field(description="True if the document helps answer the question")
+    extract: str = Field(
+        default="",
+        description="Parts of the document relevant to the question, copied as is. Empty if not relevant"
+    )
+
+
+class DocumentJudgements(BaseModel):
+    documents: list[DocumentJudgement] = Field(description="One entry per input document")
+
+
+class BatchLLMCompressor(BaseDocumentCompressor):
+    """
+    Filters or extracts from all retrieved documents in a single LLM call.
+
+    A drop-in `base_compressor` for `ContextualCompressionRetriever` that
+    replaces the one-call-per-document `LLMChainFilter` (mode="filter") and
+    `LLMChainExtractor` (mode="extract"). If the batched answer cannot be
+    parsed or misses documents, those documents are judged one per call,
+    concurrently. Provider errors are raised rather than read as "no
+    relevant documents".
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    llm: BaseLanguageModel
+    mode: Literal["filter", "extract"] = "filter"
+    max_concurrency: int = 8
+
+    @classmethod
+    def from_llm(cls, llm: BaseLanguageModel, mode: str = "filter", max_concurrency: int = 8) -> "BatchLLMCompressor":
+        return cls(llm=llm, mode=mode, max_concurrency=max_concurrency)
+
+    def judge_chain(self):
+        prompt_txt = """
+            Given the question and the numbered documents below,
+            decide for every document whether it is relevant to answering the question.
+            {task}
+
+            Output format instructions:
+            {format_instructions}
+
+            Question:
+            {question}
+
+            Documents:
+            {documents}
+        """
+        if self.mode == "extract":
+            task = (
+                "For relevant documents, also copy the parts that are relevant to the question as is "
+                "into extract. Do not edit the copied text."
+            )
+        else:
+            task = "Leave extract empty."
+        parser = JsonOutputParser(pydantic_object=DocumentJudgements)
+        prompt = PromptTemplate(
+            template=prompt_txt,
+            input_variables=['question', 'documents'],
+            partial_variables={'task': task, 'format_instructions': parser.get_format_instructions()}
+        )
+        return prompt | self.llm | parser
+
+    @staticmethod
+    def format_documents(documents: Sequence[Document]) -> str:
+        return "\n\n".join(
+            f"<document index={i}>\n{doc.page_content}\n</document>" for i, doc in enumerate(documents)
+        )
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        if not documents:
+            return []
+        chain = self.judge_chain()
+        config = {"callbacks": callbacks}
+
+        judgements = {}
+        try:
+            output = chain.invoke({'question': query, 'documents': self.format_documents(documents)}, config=config)
+            for judgement in DocumentJudgements.model_validate(output).documents:
+                if 0 <= judgement.index < len(documents):
+                    judgements[judgement.index] = judgement
+        except PARSE_ERRORS:
+            # fall back to judging every document on its own below
+            judgements = {}
+
+        missing = [i for i in range(len(documents)) if i not in judgements]
+        if missing:
+            outputs = chain.batch(
+                [{'question': query, 'documents': self.format_documents([documents[i]])} for i in missing],
+                config={**config, "max_concurrency": self.max_concurrency},
+                return_exceptions=True
+            )
+            for i, output in zip(missing, outputs):
+                if isinstance(output, PARSE_ERRORS):
+                    continue
+                if isinstance(output, Exception):
+                    raise output
+                try:
+                    single = DocumentJudgements.model_validate(output).documents
+                except ValidationError:
+                    continue
+                if single:
+                    judgements[i] = single[0]
+
+        compressed = []
+        for i, doc in enumerate(documents):
+            judgement = judgements.get(i)
+            if judgement is None or not judgement.relevant:
+                continue
+            if self.mode == "extract":
+                if not judgement.extract.strip():
+                    continue
+                compressed.append(Document(page_content=judgement.extract, metadata=doc.metadata))
+            else:
+                compressed.append(doc)
+        return compressed
@@ -0,0 +1,97 @@
+import heapq
+import math
+import os
+import pickle
+import re
+from collections import Counter
+
+from langchain_core.documents import Document
+
+# very common words carry almost no BM25 signal but have the longest posting lists
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with".split()
+)
+
+
+class BM25Index:
+    """
+    Local inverted index with Okapi BM25 scoring.
+
+    Documents are upserted and deleted by ID, so the index can follow
+    incremental ingestion. A query only visits the posting lists of its own
+    terms, which keeps lookups in the millisecond range for large corpora.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.doc_lengths = {}  # doc_id -> number of terms
+        self.documents = {}  # doc_id -> (page_content, metadata)
+        self.total_length = 0
+
+    @staticmethod
+    def tokenize(text: str) -> list[str]:
+        return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+    def __len__(self):
+        return len(self.documents)
+
+    def upsert(self, ids: list[str], documents: list[Document]):
+        self.delete(ids)
+        for doc_id, doc in zip(ids, documents):
+            terms = Counter(self.tokenize(doc.page_content))
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+            length = sum(terms.values())
+            self.doc_lengths[doc_id] = length
+            self.total_length += length
+            self.documents[doc_id] = (doc.page_content, dict(doc.metadata))
+
+    def delete(self, ids: list[str]):
+        for doc_id in ids:
+            if doc_id not in self.documents:
+                continue
+            page_content, _ = self.documents.pop(doc_id)
+            for term in set(self.tokenize(page_content)):
+                term_postings = self.postings.get(term)
+                if term_postings is not None:
+                    term_postings.pop(doc_id, None)
+                    if not term_postings:
+                        del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, k: int = 10) -> list[tuple[str, float]]:
+        n = len(self.documents)
+        if n == 0:
+            return []
+        avg_length = self.total_length / n
+        scores = {}
+        for term in set(self.tokenize(query)):
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+            idf = math.log(1 + (n - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            for doc_id, frequency in term_postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def get_document(self, doc_id: str) -> Document:
+        page_content, metadata = self.documents[doc_id]
+        return Document(page_content=page_content, metadata=dict(metadata), id=doc_id)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(self.__dict__, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str) -> "BM25Index":
+        index = BM25Index()
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                index.__dict__.update(pickle.load(file))
+        return index
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+STORE_DIRECTORY = "./catalog_store"
+CATEGORY_COLUMN = "Category"
+# columns with a sorted index for range lookups and ordering
+RANGE_COLUMNS = ("Price_USD", "Rating")
+# rows encoded at a time while writing text columns
+BUILD_CHUNK_ROWS = 100_000
+
+
+class CatalogStore:
+    """
+    Columnar, memory-mapped product catalog with lookup indexes.
+
+    Built once from a catalog DataFrame into a directory of `.npy` files and
+    afterwards opened with `mmap_mode="r"`, so opening costs the same for 30
+    rows and for millions, and only the pages a query touches are read.
+
+    - `Category` is stored as integer codes plus an index of the row
+      positions of each category, so equality lookups are slices.
+    - Each range column stores its values, its sort order and its values in
+      sorted order, so range lookups are two binary searches.
+    - Text columns are UTF-8 bytes with row offsets, decoded only for the
+      rows a query returns.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        self.columns = self.meta["columns"]
+        self.categories = self.meta["categories"]
+        self._code_by_category = {category.lower(): code for code, category in enumerate(self.categories)}
+        self._arrays = {}
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    def _array(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            self._arrays[name] = np.load(self.path / f"{name}.npy", mmap_mode="r")
+        return self._arrays[name]
+
+    @staticmethod
+    def build(df: pd.DataFrame, path: str) -> "CatalogStore":
+        # written next to the target and renamed into place, so readers never see a partial store
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=target.parent, prefix=".building-"))
+        try:
+            categories = pd.Categorical(df[CATEGORY_COLUMN])
+            codes = categories.codes.astype(np.int32)
+            np.save(staging / f"{CATEGORY_COLUMN}.codes.npy", codes)
+            np.save(staging / f"{CATEGORY_COLUMN}.rows.npy", np.argsort(codes, kind="stable"))
+            np.save(
+                staging / f"{CATEGORY_COLUMN}.offsets.npy",
+                np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(categories.categories)))])
+            )
+            for column in RANGE_COLUMNS:
+                values = df[column].to_numpy()
+                order = np.argsort(values, kind="stable")
+                np.save(staging / f"{column}.npy", values)
+                np.save(staging / f"{column}.order.npy", order)
+                np.save(staging / f"{column}.sorted.npy", values[order])
+            text_columns = [column for column in df.columns if column != CATEGORY_COLUMN and column not in RANGE_COLUMNS]
+            for column in text_columns:
+                CatalogStore._save_text(df[column], staging, column)
+            meta = {
+                "rows": len(df),
+                "columns": list(df.columns),
+                "categories": [str(category) for category in categories.categories],
+            }
+            (staging / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+            if target.exists():
+                shutil.rmtree(target)
+            os.replace(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return CatalogStore(str(target))
+
+    @staticmethod
+    def _save_text(values: pd.Series, staging: Path, column: str) -> None:
+        # encoded chunk by chunk straight into the memory-mapped file, so the text is never held twice
+        chunks = [values.iloc[start:start + BUILD_CHUNK_ROWS] for start in range(0, len(values), BUILD_CHUNK_ROWS)]
+        lengths = np.fromiter(
+            (len(str(value).encode("utf-8")) for chunk in chunks for value in chunk), dtype=np.int64, count=len(values)
+        )
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        np.save(staging / f"{column}.offsets.npy", offsets)
+        blob = np.lib.format.open_memmap(
+            staging / f"{column}.data.npy", mode="w+", dtype=np.uint8, shape=(int(offsets[-1]),)
+        )
+        for chunk, start in zip(chunks, range(0, len(values), BUILD_CHUNK_ROWS)):
+            encoded = "".join(str(value) for value in chunk).encode("utf-8")
+            blob[offsets[start]:offsets[start] + len(encoded)] = np.frombuffer(encoded, dtype=np.uint8)
+        blob.flush()
+        del blob
+
+    @staticmethod
+    def open_or_build(csv_path: str, directory: str = STORE_DIRECTORY) -> "CatalogStore":
+        """
+        Opens the store built from the current version of `csv_path`, building it on first use.
+        """
+        stat = os.stat(csv_path)
+        version = hashlib.sha256(f"{os.path.abspath(csv_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        path = Path(directory) / f"{Path(csv_path).stem}-{version.hexdigest()[:16]}"
+        if (path / "meta.json").exists():
+            return CatalogStore(str(path))
+        return CatalogStore.build(pd.read_csv(csv_path), str(path))
+
+    def category_code(self, category: str) -> Optional[int]:
+        name = category.strip().lower()
+        # "Laptops" asks for the "Laptop" category and "Headphone" for "Headphones"
+        for candidate in (name, name[:-1] if name.endswith("s") else None, name[:-2] if name.endswith("es") else None, f"{name}s"):
+            if candidate in self._code_by_category:
+                return self._code_by_category[candidate]
+        return None
+
+    def category_codes(self, categories: list[str]) -> list[int]:
+        # categories the catalog does not have are dropped
+        codes = (self.category_code(category) for category in categories)
+        return [code for code in codes if code is not None]
+
+    def category_size(self, codes: list[int]) -> int:
+        offsets = self._array(f"{CATEGORY_COLUMN}.offsets")
+        return int(sum(offsets[code + 1] - offsets[code] for code in set(codes)))
+
+    def category_rows(self, codes: list[int]) -> np.ndarray:
+        """
+        Returns the positions of the rows in any of the category `codes`, ascending.
+        """
+        rows, offsets = self._array(f"{CATEGORY_COLUMN}.rows"), self._array(f"{CATEGORY_COLUMN}.offsets")
+        slices = [rows[offsets[code]:offsets[code + 1]] for code in sorted(set(codes))]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(slices)) if len(slices) > 1 else np.asarray(slices[0])
+
+    def category_values(self) -> np.ndarray:
+        return self._array(f"{CATEGORY_COLUMN}.codes")
+
+    def _range_bounds(self, column: str, low: Optional[float], high: Optional[float]) -> tuple[int, int]:
+        ordered = self._array(f"{column}.sorted")
+        # bounds in the column's dtype, a float key would make numpy convert the whole column
+        if np.issubdtype(ordered.dtype, np.integer):
+            low = math.ceil(low) if low is not None else None
+            high = math.floor(high) if high is not None else None
+        start = int(np.searchsorted(ordered, ordered.dtype.type(low), side="left")) if low is not None else 0
+        end = int(np.searchsorted(ordered, ordered.dtype.type(high), side="right")) if high is not None else len(ordered)
+        return start, max(start, end)
+
+    def range_size(self, column: str, low: Optional[float] = None, high: Optional[float] = None) -> int:
+        start, end = self._range_bounds(column, low, high)
+        return end - start
+
+    def range_rows(self, column: str, low: Optional[float] = None, high: Optional[float] = None) -> np.ndarray:
+        """
+        Returns the positions of the rows with `low <= column <= high`, in value order.
+        """
+        start, end = self._range_bounds(column, low, high)
+        return np.asarray(self._array(f"{column}.order")[start:end])
+
+    def values(self, column: str) -> np.ndarray:
+        return self._array(column)
+
+    def order(self, column: str) -> np.ndarray:
+        return self._array(f"{column}.order")
+
+    def rows(self, positions: np.ndarray) -> pd.DataFrame:
+        """
+        Materializes the rows at `positions`, in the given order, with the catalog's columns.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        data = {}
+        for column in self.columns:
+            if column == CATEGORY_COLUMN:
+                codes = self._array(f"{CATEGORY_COLUMN}.codes")[positions]
+                data[column] = np.asarray(self.categories, dtype=object)[codes] if len(codes) else []
+            elif column in RANGE_COLUMNS:
+                data[column] = self._array(column)[positions]
+            else:
+                blob, offsets = self._array(f"{column}.data"), self._array(f"{column}.offsets")
+                data[column] = [
+                    bytes(blob[offsets[position]:offsets[position + 1]]).decode("utf-8") for position in positions
+                ]
+        return pd.DataFrame(data, index=positions)
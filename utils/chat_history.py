@@ -0,0 +1,122 @@
+import json
+import threading
+from typing import Optional, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+
+HISTORY_DB_URL = "sqlite:///memory.db"
+# the table SQLChatMessageHistory created, so existing conversations carry over
+TABLE_NAME = "message_store"
+# messages returned as history, the last 10 user-AI exchanges
+DEFAULT_WINDOW = 20
+# messages kept per session, older ones are deleted as new ones arrive
+DEFAULT_RETAIN = 200
+
+# process-wide engines keyed by database URL
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _enable_wal(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    # readers no longer wait for the writer, and commits skip the full fsync
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+def history_engine(url: str = HISTORY_DB_URL) -> Engine:
+    with _engines_lock:
+        if url not in _engines:
+            engine = create_engine(url, pool_size=5, max_overflow=10, connect_args={"check_same_thread": False})
+            event.listen(engine, "connect", _enable_wal)
+            # created once here, so concurrent first sessions cannot race on CREATE TABLE
+            with engine.begin() as connection:
+                connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {TABLE_NAME} "
+                    "(id INTEGER NOT NULL PRIMARY KEY, session_id TEXT, message TEXT)"
+                ))
+                connection.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_session ON {TABLE_NAME} (session_id, id)"
+                ))
+            _engines[url] = engine
+        return _engines[url]
+
+
+class WindowedChatHistory(BaseChatMessageHistory):
+    """
+    SQL chat history that only ever reads the latest `window` messages of a session.
+
+    All sessions share one pooled engine per database. The window is selected
+    in SQL through the (session_id, id) index, so reading history costs the
+    same however many messages the database holds. Messages of a turn are
+    inserted in one transaction, which also deletes the session's messages
+    beyond the newest `retain`.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        window: int = DEFAULT_WINDOW,
+        retain: Optional[int] = DEFAULT_RETAIN,
+        url: str = HISTORY_DB_URL
+    ):
+        self.session_id = session_id
+        self.window = window
+        self.retain = retain
+        self.engine = history_engine(url)
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                text(f"SELECT message FROM {TABLE_NAME} WHERE session_id = :session_id ORDER BY id DESC LIMIT :window"),
+                {"session_id": self.session_id, "window": self.window}
+            ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in reversed(rows)])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(f"INSERT INTO {TABLE_NAME} (session_id, message) VALUES (:session_id, :message)"),
+                [{"session_id": self.session_id, "message": json.dumps(message_to_dict(message))} for message in messages]
+            )
+            if self.retain is not None:
+                self._prune_session(connection, self.session_id, self.retain)
+
+    def clear(self) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(text(f"DELETE FROM {TABLE_NAME} WHERE session_id = :session_id"), {"session_id": self.session_id})
+
+    @staticmethod
+    def _prune_session(connection, session_id: str, retain: int) -> int:
+        return connection.execute(
+            text(
+                f"DELETE FROM {TABLE_NAME} WHERE session_id = :session_id AND id <= ("
+                f"SELECT id FROM {TABLE_NAME} WHERE session_id = :session_id ORDER BY id DESC LIMIT 1 OFFSET :retain)"
+            ),
+            {"session_id": session_id, "retain": retain}
+        ).rowcount
+
+    @staticmethod
+    def prune(retain: int = DEFAULT_RETAIN, url: str = HISTORY_DB_URL) -> int:
+        """
+        Deletes every session's messages beyond its newest `retain`, e.g. for histories
+        written before retention existed.
+
+        Returns:
+            int: The number of messages deleted.
+        """
+        engine = history_engine(url)
+        with engine.begin() as connection:
+            sessions = connection.execute(
+                text(f"SELECT session_id FROM {TABLE_NAME} GROUP BY session_id HAVING COUNT(*) > :retain"),
+                {"retain": retain}
+            ).fetchall()
+            return sum(WindowedChatHistory._prune_session(connection, row[0], retain) for row in sessions)
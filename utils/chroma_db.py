@@ -1,13 +1,88 @@
+import hashlib
+import threading
 from langchain_chroma import Chroma
 import streamlit as st
 import os
 from langchain_openai import OpenAIEmbeddings
+from utils.embedding_cache import CachedEmbeddings
+from llm.fake import FakeEmbeddings, fake_backend_enabled, fake_latency_s
+
+# process-wide cached embedding wrappers, one per model
+_embeddings = {}
+_embeddings_lock = threading.Lock()
+
+# process-wide vector stores keyed by (corpus hash, embedding model, distance metric)
+_stores = {}
+_stores_lock = threading.Lock()
+# one lock per store so embedding one corpus does not block sessions asking for another
+_store_build_locks = {}
 
 class ChromaDB:
     @staticmethod
-    def from_docs():
+    def embeddings(model: str = 'text-embedding-3-small') -> CachedEmbeddings:
+        if fake_backend_enabled():
+            # offline hash-based vectors, cached under their own model name
+            with _embeddings_lock:
+                key = f"fake:{model}"
+                if key not in _embeddings:
+                    _embeddings[key] = CachedEmbeddings(FakeEmbeddings(latency_s=fake_latency_s()), model_name=key)
+                return _embeddings[key]
         os.environ['OPENAI_API_KEY'] = st.session_state.openai_api_key
-        openai_embed_model = OpenAIEmbeddings(model='text-embedding-3-small')
+        with _embeddings_lock:
+            if model not in _embeddings:
+                _embeddings[model] = CachedEmbeddings(OpenAIEmbeddings(model=model), model_name=model)
+            return _embeddings[model]
+
+    @staticmethod
+    def embedding_cache_stats(model: str = 'text-embedding-3-small') -> dict:
+        if fake_backend_enabled():
+            model = f"fake:{model}"
+        with _embeddings_lock:
+            if model not in _embeddings:
+                return {"model": model, "hits": 0, "misses": 0, "hit_ratio": 0.0}
+            cached = _embeddings[model]
+        return cached.stats()
+
+    @staticmethod
+    def shared_store(texts: list[str], model: str = 'text-embedding-3-small', distance: str = 'cosine') -> Chroma:
+        """
+        Returns the vector store for `texts`, building it only the first time.
+
+        Every session and exercise asking for the same corpus, embedding model
+        and distance metric gets the same Chroma instance. Each store lives in
+        its own collection and texts are upserted by content hash, so reruns
+        never append duplicates.
+        """
+        text_ids = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        corpus_hash = hashlib.sha256("".join(text_ids).encode("utf-8")).hexdigest()
+        embedding = ChromaDB.embeddings(model)
+        key = (corpus_hash, embedding.model_name, distance)
+        with _stores_lock:
+            if key in _stores:
+                return _stores[key]
+            build_lock = _store_build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with _stores_lock:
+                # another session may have built it while this one waited
+                if key in _stores:
+                    return _stores[key]
+            collection_id = hashlib.sha256("|".join(key).encode("utf-8")).hexdigest()[:16]
+            store = Chroma(
+                collection_name=f'db_docs_{collection_id}',
+                # need to set the distance function to cosine else it uses euclidean by default
+                # check https://docs.trychroma.com/guides#changing-the-distance-function
+                collection_metadata={"hnsw:space": distance},
+                embedding_function=embedding
+            )
+            unique_texts = dict(zip(text_ids, texts))
+            store.add_texts(texts=list(unique_texts.values()), ids=list(unique_texts.keys()))
+            with _stores_lock:
+                _stores[key] = store
+        return store
+
+    @staticmethod
+    def from_docs():
         docs = [
             'Quantum mechanics describes the behavior of very small particles.',
             'Photosynthesis is the process by which green plants make food using sunlight.',
@@ -22,12 +97,5 @@ class ChromaDB:
             'Kolkata is the de facto cultural capital of India and a historically and culturally significant city. Calcutta served as the de facto capital of India until 1911.',
             'Yoga is an ancient practice that involves physical postures and meditation.'
         ]
-        # create vector DB of docs and embeddings - takes 1 min on Colab
-        return Chroma.from_texts(
-            texts=docs, 
-            collection_name='db_docs',
-            # need to set the distance function to cosine else it uses euclidean by default
-            # check https://docs.trychroma.com/guides#changing-the-distance-function
-            collection_metadata={"hnsw:space": "cosine"},
-            embedding=openai_embed_model
-        )
\ No newline at end of file
+        # create vector DB of docs and embeddings once per process
+        return ChromaDB.shared_store(docs)
\ No newline at end of file
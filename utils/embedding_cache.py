@@ -0,0 +1,159 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps any LangChain `Embeddings` object with a persistent on-disk cache.
+
+    Vectors are stored in SQLite as float32 blobs keyed by
+    (model name, sha256 of the text), so repeat requests and app restarts
+    do not hit the embedding API again. The cache is capped at `max_entries`
+    and evicts the least recently used vectors first.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str = None,
+        db_path: str = "./embedding_cache.db",
+        max_entries: int = 50_000,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors = self._lookup(keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in vectors]
+        # dedup within the batch so the same text is only embedded once
+        missing_texts = {keys[i]: texts[i] for i in missing}
+        with self._lock:
+            # a text repeated within the batch is embedded once, so only its first occurrence misses
+            self.hits += len(texts) - len(missing_texts)
+            self.misses += len(missing_texts)
+
+        if missing_texts:
+            new_vectors = self.embeddings.embed_documents(list(missing_texts.values()))
+            computed = {key: array("f", vector) for key, vector in zip(missing_texts.keys(), new_vectors)}
+            self._store(computed)
+            vectors.update(computed)
+
+        return [list(vectors[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vectors = self._lookup([key])
+        if key in vectors:
+            with self._lock:
+                self.hits += 1
+            return list(vectors[key])
+
+        with self._lock:
+            self.misses += 1
+        # returned as stored, so a cold and a warm call give the same vector
+        vector = array("f", self.embeddings.embed_query(text))
+        self._store({key: vector})
+        return list(vector)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model_name,)
+            ).fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": size,
+                "max_entries": self.max_entries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings WHERE model = ?", (self.model_name,))
+            self._conn.commit()
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> dict:
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            # stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    (self.model_name, *batch),
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[text_hash] = vector
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    [(now, self.model_name, text_hash) for text_hash in found],
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, vectors: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                [
+                    (self.model_name, text_hash, array("f", vector).tobytes(), now)
+                    for text_hash, vector in vectors.items()
+                ],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # LRU eviction across all models sharing this cache file
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                """
+                DELETE FROM embeddings WHERE rowid IN (
+                    SELECT rowid FROM embeddings ORDER BY last_access ASC LIMIT ?
+                )
+                """,
+                (overflow,),
+            )
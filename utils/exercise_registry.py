@@ -0,0 +1,141 @@
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+
+# process-wide import profile, kept across reruns and sessions
+_loads = {}
+_loads_lock = threading.Lock()
+# one profiled import at a time, imports on other threads pass through untimed
+_profile_lock = threading.Lock()
+
+TOP_MODULES = 15
+
+
+class _TimedLoader:
+    def __init__(self, loader, profiler: "ImportProfiler", name: str):
+        self._loader = loader
+        self._profiler = profiler
+        self._name = name
+
+    def __getattr__(self, item):
+        return getattr(self._loader, item)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # the real loader goes back in place so nothing later sees the wrapper
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        self._profiler.enter(self._name)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler.exit()
+
+
+class ImportProfiler(MetaPathFinder):
+    """
+    In-process equivalent of `python -X importtime`.
+
+    While installed on `sys.meta_path` it times the execution of every module
+    newly imported on the installing thread and records, per module, the
+    cumulative time including its own imports and the self time without them.
+    """
+
+    def __init__(self):
+        self.records = []  # dicts with module, depth, cumulative_ms, self_ms
+        self._thread = threading.get_ident()
+        self._stack = []  # [name, start, time spent in child imports]
+
+    def find_spec(self, fullname, path, target=None):
+        if threading.get_ident() != self._thread:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self, fullname)
+        return spec
+
+    def enter(self, name: str) -> None:
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def exit(self) -> None:
+        name, start, children = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        self.records.append({
+            "module": name,
+            "depth": len(self._stack),
+            "cumulative_ms": round(elapsed * 1000, 1),
+            "self_ms": round((elapsed - children) * 1000, 1),
+        })
+
+    @contextmanager
+    def installed(self):
+        sys.meta_path.insert(0, self)
+        try:
+            yield self
+        finally:
+            sys.meta_path.remove(self)
+
+
+class ExerciseRegistry:
+    """
+    Imports exercises and their heavy dependencies on first use, timing each one.
+
+    `load` imports an exercise module, `dependency` defers a heavy library
+    until the feature that needs it runs. Both record the import time and
+    the slowest modules it pulled in, readable through `profile()`.
+    """
+
+    @staticmethod
+    @contextmanager
+    def profiled(name: str, kind: str):
+        with _profile_lock:
+            profiler = ImportProfiler()
+            start = time.perf_counter()
+            with profiler.installed():
+                yield
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        # already imported modules cost nothing, so only first imports are recorded
+        if not profiler.records:
+            return
+        with _loads_lock:
+            _loads[name] = {
+                "name": name,
+                "kind": kind,
+                "import_ms": round(elapsed_ms, 1),
+                "modules": len(profiler.records),
+                "top": sorted(profiler.records, key=lambda record: record["self_ms"], reverse=True)[:TOP_MODULES],
+            }
+
+    @staticmethod
+    def load(module_path: str):
+        if module_path in sys.modules:
+            return sys.modules[module_path]
+        with ExerciseRegistry.profiled(module_path, "exercise"):
+            return importlib.import_module(module_path)
+
+    @staticmethod
+    def dependency(module_path: str):
+        if module_path in sys.modules:
+            return sys.modules[module_path]
+        with ExerciseRegistry.profiled(module_path, "dependency"):
+            return importlib.import_module(module_path)
+
+    @staticmethod
+    def profile() -> list[dict]:
+        with _loads_lock:
+            return sorted(_loads.values(), key=lambda load: load["import_ms"], reverse=True)
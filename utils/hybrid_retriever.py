@@ -0,0 +1,64 @@
+import hashlib
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from utils.bm25_index import BM25Index
+
+
+def document_key(doc: Document) -> str:
+    # chunk IDs assigned at ingestion, else the vector store ID, else the content itself
+    return doc.metadata.get("chunk_id") or doc.id or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """
+    Fuses several rankings of document keys with reciprocal rank fusion.
+
+    Args:
+        rankings (list[list[str]]): Document keys, best first, one list per ranker.
+        k (int): Damping constant, 60 as in the original RRF paper.
+
+    Returns:
+        list[tuple[str, float]]: Document keys with their fused score, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses a dense vector retriever with a BM25 index using reciprocal rank fusion.
+
+    Exact names and titles are caught by the lexical ranking, paraphrases by
+    the dense one, without any extra LLM round trip.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    dense_retriever: BaseRetriever
+    bm25_index: BM25Index
+    k: int = 3
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        dense_docs = self.dense_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        lexical_hits = self.bm25_index.search(query, k=self.fetch_k)
+
+        docs_by_key = {document_key(doc): doc for doc in dense_docs}
+        fused = reciprocal_rank_fusion(
+            [list(docs_by_key.keys()), [doc_id for doc_id, _ in lexical_hits]],
+            k=self.rrf_k
+        )
+        results = []
+        for key, score in fused[:self.k]:
+            doc = docs_by_key.get(key) or self.bm25_index.get_document(key)
+            doc.metadata["rrf_score"] = round(score, 5)
+            results.append(doc)
+        return results
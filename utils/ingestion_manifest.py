@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+
+
+class IngestionManifest:
+    """
+    Per-source record of what has been ingested into a vector store.
+
+    Each source (a PDF, a JSONL record, ...) maps to the hash of its content,
+    the IDs of the chunks stored for it and the embedding model used, so that
+    ingestion only needs to touch sources that were added, changed or removed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sources = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.sources = json.load(file).get("sources", {})
+
+    @staticmethod
+    def content_hash(content) -> str:
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        return hashlib.sha256(content).hexdigest()
+
+    def diff(self, current: dict, embedding_model: str) -> tuple[list, list]:
+        """
+        Compares the current sources against the manifest.
+
+        Args:
+            current (dict): Source name to content hash for every source on disk.
+            embedding_model (str): Embedding model the store is built with.
+
+        Returns:
+            tuple[list, list]: Sources that are new or changed, and sources that were removed.
+        """
+        changed = [
+            source for source, content_hash in current.items()
+            if source not in self.sources
+            or self.sources[source]["hash"] != content_hash
+            or self.sources[source]["embedding_model"] != embedding_model
+        ]
+        removed = [source for source in self.sources if source not in current]
+        return changed, removed
+
+    def chunk_ids(self, source: str) -> list:
+        return self.sources.get(source, {}).get("chunk_ids", [])
+
+    def record(self, source: str, content_hash: str, chunk_ids: list, embedding_model: str):
+        self.sources[source] = {
+            "hash": content_hash,
+            "chunk_ids": chunk_ids,
+            "embedding_model": embedding_model,
+        }
+
+    def remove(self, source: str):
+        self.sources.pop(source, None)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # write to a temp file first so an interrupted ingestion never leaves a corrupt manifest
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"sources": self.sources}, file)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,249 @@
+import json
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# process-wide job queues keyed by database path
+_queues = {}
+_queues_lock = threading.Lock()
+
+ACTIVE_STATUSES = ("queued", "running")
+# statuses a resubmitted job resumes from, using the checkpoint the previous attempt saved
+RESUMABLE_STATUSES = ("failed", "cancelled", "interrupted")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """
+    Handle passed to a running job for reporting progress, checking for
+    cancellation and saving checkpoints.
+    """
+
+    def __init__(self, queue: "JobQueue", job_id: str, checkpoint: dict):
+        self.queue = queue
+        self.job_id = job_id
+        self.checkpoint = checkpoint
+
+    def progress(self, fraction: Optional[float] = None, message: str = "") -> None:
+        self.queue._event(self.job_id, fraction, message)
+
+    def log(self, message: str) -> None:
+        self.progress(None, message)
+
+    def cancelled(self) -> bool:
+        return self.queue._cancel_requested(self.job_id)
+
+    def check_cancelled(self) -> None:
+        if self.cancelled():
+            raise JobCancelled(self.job_id)
+
+    def save_checkpoint(self, checkpoint: dict) -> None:
+        self.checkpoint = checkpoint
+        self.queue._update(self.job_id, checkpoint=json.dumps(checkpoint))
+
+
+class JobQueue:
+    """
+    Local background job queue backed by a SQLite job table.
+
+    Jobs run on a thread pool, so long ingestions and summaries neither block
+    the Streamlit script thread nor die when the user navigates away. Job
+    status, progress events, checkpoints and results live in SQLite, where
+    later reruns and other sessions find them. Submitting a job while one
+    with the same kind and key is active returns the active one. A job
+    submitted after an unfinished attempt starts from that attempt's
+    checkpoint. Cancellation is cooperative: running jobs stop at their next
+    `check_cancelled()`.
+    """
+
+    def __init__(self, db_path: str = "./jobs.db", max_workers: int = 4):
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                checkpoint TEXT NOT NULL DEFAULT '{}',
+                result TEXT,
+                error TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                at REAL NOT NULL,
+                progress REAL,
+                message TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_kind_key ON jobs (kind, key, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, at)")
+        # threads of a previous process are gone, so whatever they were running can only be resumed
+        self._conn.execute(
+            "UPDATE jobs SET status = 'interrupted', finished_at = ? WHERE status IN ('queued', 'running')",
+            (time.time(),)
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def shared(db_path: str = "./jobs.db") -> "JobQueue":
+        with _queues_lock:
+            if db_path not in _queues:
+                _queues[db_path] = JobQueue(db_path)
+            return _queues[db_path]
+
+    def submit(self, kind: str, fn: Callable[[JobContext], Any], key: str = "") -> str:
+        """
+        Queues `fn` to run in the background.
+
+        Args:
+            kind (str): The kind of job, e.g. "search_engine_ingest".
+            fn (Callable): Receives a JobContext and returns a JSON-serializable result.
+                Build it in the script thread: workers cannot read st.session_state.
+            key (str): Identifies what the job works on. Active jobs of the same kind
+                and key are shared instead of started twice.
+
+        Returns:
+            str: The ID of the new or already active job.
+        """
+        with self._lock:
+            active = self._conn.execute(
+                f"SELECT id FROM jobs WHERE kind = ? AND key = ? AND status IN {ACTIVE_STATUSES} "
+                "ORDER BY created_at DESC LIMIT 1",
+                (kind, key)
+            ).fetchone()
+            if active is not None:
+                return active[0]
+            previous = self._conn.execute(
+                "SELECT status, checkpoint FROM jobs WHERE kind = ? AND key = ? ORDER BY created_at DESC LIMIT 1",
+                (kind, key)
+            ).fetchone()
+            checkpoint = previous[1] if previous and previous[0] in RESUMABLE_STATUSES else "{}"
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, key, status, checkpoint, created_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, key, checkpoint, time.time())
+            )
+            self._conn.commit()
+        self._executor.submit(self._run, job_id, fn, json.loads(checkpoint))
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable[[JobContext], Any], checkpoint: dict) -> None:
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row[0] != "queued":
+                # cancelled while it waited for a worker
+                return
+            self._conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), job_id))
+            self._conn.commit()
+        if checkpoint:
+            self._event(job_id, None, "Resuming from the checkpoint of an earlier attempt")
+        context = JobContext(self, job_id, checkpoint)
+        try:
+            result = fn(context)
+            self._update(job_id, status="succeeded", progress=1.0, result=json.dumps(result), finished_at=time.time())
+        except JobCancelled:
+            self._update(job_id, status="cancelled", finished_at=time.time())
+        except Exception as e:
+            self._update(
+                job_id,
+                status="failed",
+                error=f"{type(e).__name__}: {e}\n{traceback.format_exc()}",
+                finished_at=time.time()
+            )
+
+    def _update(self, job_id: str, **fields) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _event(self, job_id: str, fraction: Optional[float], message: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO job_events (job_id, at, progress, message) VALUES (?, ?, ?, ?)",
+                (job_id, now, fraction, message)
+            )
+            if fraction is None:
+                self._conn.execute("UPDATE jobs SET message = ? WHERE id = ?", (message, job_id))
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET progress = ?, message = ? WHERE id = ?",
+                    (min(max(fraction, 0.0), 1.0), message, job_id)
+                )
+            self._conn.commit()
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            if cursor.rowcount == 0:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+                )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    @staticmethod
+    def _row(cursor, row) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(zip([column[0] for column in cursor.description], row))
+        job["checkpoint"] = json.loads(job["checkpoint"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            return self._row(cursor, cursor.fetchone())
+
+    def latest(self, kind: str, key: str = "") -> Optional[dict]:
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT * FROM jobs WHERE kind = ? AND key = ? ORDER BY created_at DESC LIMIT 1", (kind, key)
+            )
+            return self._row(cursor, cursor.fetchone())
+
+    def events(self, job_id: str, limit: int = 20) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT at, progress, message FROM job_events WHERE job_id = ? ORDER BY at DESC LIMIT ?",
+                (job_id, limit)
+            ).fetchall()
+        return [{"at": at, "progress": progress, "message": message} for at, progress, message in reversed(rows)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
@@ -0,0 +1,124 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict
+
+from llm.openai import LLM
+from utils.hybrid_retriever import document_key, reciprocal_rank_fusion
+
+# same logger as LangChain's MultiQueryRetriever so the exercises' log panels pick it up
+logger = logging.getLogger("langchain.retrievers.multi_query")
+
+# process-wide LRU of generated query variants keyed by LLM client, prompt and normalized query
+_variants = OrderedDict()
+_variants_lock = threading.Lock()
+MAX_CACHED_QUERIES = 1024
+
+
+class CachedMultiQueryRetriever(BaseRetriever):
+    """
+    Multi-query retrieval with cached query variants and concurrent searches.
+
+    Query variants are generated once per LLM client, prompt and normalized
+    query, and reused.
+    The original query and its variants are embedded in one batched
+    request, searched against the vector store concurrently, and the
+    rankings are fused by document ID with reciprocal rank fusion.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: VectorStore
+    llm: BaseLanguageModel
+    k: int = 3
+    num_variants: int = 3
+    rrf_k: int = 60
+    max_workers: int = 8
+    prompt_txt: str = """
+            You are an AI language model assistant. Your task is
+            to generate {num_variants} different versions of the given user
+            question to retrieve relevant documents from a vector database.
+            By generating multiple perspectives on the user question,
+            your goal is to help the user overcome some of the limitations
+            of distance-based similarity search. Provide these alternative
+            questions separated by newlines.
+            Original question: {question}
+        """
+
+    @classmethod
+    def from_llm(cls, vectorstore: VectorStore, llm: BaseLanguageModel, **kwargs) -> "CachedMultiQueryRetriever":
+        return cls(vectorstore=vectorstore, llm=llm, **kwargs)
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return re.sub(r"\s+", " ", query).strip().lower()
+
+    def variants_chain(self):
+        prompt = PromptTemplate.from_template(self.prompt_txt)
+        return prompt | self.llm | StrOutputParser()
+
+    def generate_variants(self, query: str, run_manager: CallbackManagerForRetrieverRun) -> tuple[list[str], bool]:
+        key = (LLM.client_key(self.llm), self.prompt_txt, self.num_variants, self.normalize(query))
+        with _variants_lock:
+            if key in _variants:
+                _variants.move_to_end(key)
+                return _variants[key], True
+
+        output = self.variants_chain().invoke(
+            {'question': query, 'num_variants': self.num_variants},
+            config={"callbacks": run_manager.get_child()}
+        )
+        variants = [line.strip() for line in output.split("\n") if line.strip()]
+        with _variants_lock:
+            _variants[key] = variants
+            while len(_variants) > MAX_CACHED_QUERIES:
+                _variants.popitem(last=False)
+        return variants, False
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        start = time.perf_counter()
+        variants, cached = self.generate_variants(query, run_manager)
+        generated = time.perf_counter()
+        logger.info(f"Generated queries: {variants}")
+
+        queries = list(dict.fromkeys([query, *variants]))
+        # one embeddings request for every query instead of one per search
+        vectors = self.vectorstore.embeddings.embed_documents(queries)
+        embedded = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(vectors))) as pool:
+            results = list(pool.map(
+                lambda vector: self.vectorstore.similarity_search_by_vector(vector, k=self.k),
+                vectors
+            ))
+        searched = time.perf_counter()
+
+        docs_by_key = {}
+        rankings = []
+        for docs in results:
+            ranking = []
+            for doc in docs:
+                key = document_key(doc)
+                docs_by_key.setdefault(key, doc)
+                ranking.append(key)
+            rankings.append(ranking)
+        fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)
+
+        logger.info(
+            f"Timing: generation {(generated - start) * 1000:.0f} ms{' (cached)' if cached else ''} | "
+            f"embedding {(embedded - generated) * 1000:.0f} ms | "
+            f"search {(searched - embedded) * 1000:.0f} ms for {len(queries)} queries | "
+            f"{len(docs_by_key)} unique documents"
+        )
+        return [docs_by_key[key] for key, _ in fused]
@@ -0,0 +1,202 @@
+import bisect
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Literal, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, Field
+
+from utils.catalog_store import CatalogStore
+from utils.semantic_cache import percentile
+
+# compiled specs kept per catalog, least recently used dropped first
+MAX_COMPILED_SPECS = 256
+# filter specs generated for user queries, reused when the same query comes again
+MAX_CACHED_QUERIES = 1024
+
+
+class FilterSpec(BaseModel):
+    categories: list[str] = Field(default=[], description="Categories to keep, empty for all categories")
+    min_price: Optional[float] = Field(default=None, description="Lowest Price_USD to keep")
+    max_price: Optional[float] = Field(default=None, description="Highest Price_USD to keep")
+    min_rating: Optional[float] = Field(default=None, description="Lowest Rating to keep, from 1 to 5")
+    sort_by: Optional[Literal["price", "rating"]] = Field(default=None, description="Column to order the products by")
+    descending: bool = Field(default=False, description="True to order from highest to lowest")
+    limit: Optional[int] = Field(default=None, ge=1, description="Maximum number of products to return")
+
+    def cache_key(self) -> tuple:
+        return (
+            tuple(sorted({category.lower() for category in self.categories})),
+            self.min_price, self.max_price, self.min_rating, self.sort_by, self.descending, self.limit
+        )
+
+
+class RephrasedFilter(BaseModel):
+    query: str = Field(description="The current user query rephrased into a standalone query")
+    filter: FilterSpec = Field(description="Product filter spec selecting the products for the standalone query")
+
+
+class ProductFilter:
+    """
+    Filter engine over a `CatalogStore`, driven by a `FilterSpec` instead of generated code.
+
+    Each condition of a spec can be answered by one of the store's indexes:
+    a category lookup or a binary search over a sorted price or rating
+    column. Only the condition matching the fewest rows is looked up; the
+    others are checked as vectorized masks over those rows alone, so a
+    selective query touches a small part of a catalog with millions of rows.
+    The selected row positions are cached per spec, and the specs generated
+    for user queries per normalized query.
+    """
+
+    SORT_COLUMNS = {"price": "Price_USD", "rating": "Rating"}
+
+    def __init__(self, store: CatalogStore):
+        self.store = store
+        self.categories = store.categories
+        self._compiled = OrderedDict()
+        self._specs = OrderedDict()
+        self._lock = threading.Lock()
+        self.filter_ms = []
+        self.hits = 0
+        self.spec_hits = 0
+
+    @staticmethod
+    def _query_key(query: str) -> str:
+        # case, spacing and trailing punctuation do not change what a query asks for
+        return " ".join(re.findall(r"\d+(?:\.\d+)?|\w+", query.lower()))
+
+    def cached_spec(self, query: str) -> Optional[FilterSpec]:
+        key = self._query_key(query)
+        with self._lock:
+            spec = self._specs.get(key)
+            if spec is not None:
+                self._specs.move_to_end(key)
+                self.spec_hits += 1
+            return spec
+
+    def cache_spec(self, query: str, spec: FilterSpec) -> None:
+        with self._lock:
+            self._specs[self._query_key(query)] = spec
+            if len(self._specs) > MAX_CACHED_QUERIES:
+                self._specs.popitem(last=False)
+
+    def _in_categories(self, codes: list[int], rows: np.ndarray) -> np.ndarray:
+        return np.isin(self.store.category_values()[rows], codes)
+
+    def _in_range(self, column: str, low: Optional[float], high: Optional[float], rows: np.ndarray) -> np.ndarray:
+        values = self.store.values(column)[rows]
+        mask = np.ones(len(rows), dtype=bool)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
+
+    def compile(self, spec: FilterSpec) -> np.ndarray:
+        """
+        Returns the positions of the rows selected by `spec`, in output order.
+        """
+        # (matching rows per the index, index lookup, the same condition as a mask over given rows)
+        conditions = []
+        codes = self.store.category_codes(spec.categories)
+        if spec.categories and not codes:
+            # none of the asked for categories exist, which matches no product rather than every one
+            return np.arange(0)
+        if codes:
+            conditions.append((
+                self.store.category_size(codes),
+                partial(self.store.category_rows, codes),
+                partial(self._in_categories, codes)
+            ))
+        for column, low, high in (("Price_USD", spec.min_price, spec.max_price), ("Rating", spec.min_rating, None)):
+            if low is not None or high is not None:
+                conditions.append((
+                    self.store.range_size(column, low, high),
+                    partial(self.store.range_rows, column, low, high),
+                    partial(self._in_range, column, low, high)
+                ))
+
+        if conditions:
+            conditions.sort(key=lambda condition: condition[0])
+            rows = np.sort(conditions[0][1]())
+            for _, _, check in conditions[1:]:
+                rows = rows[check(rows)]
+            if spec.sort_by is not None:
+                rows = self._sorted(rows, spec)
+        elif spec.sort_by is not None:
+            rows = self._ordered(spec)
+        else:
+            rows = np.arange(len(self.store))
+        return rows[:spec.limit] if spec.limit is not None else rows
+
+    def _sorted(self, rows: np.ndarray, spec: FilterSpec) -> np.ndarray:
+        values = self.store.values(self.SORT_COLUMNS[spec.sort_by])[rows]
+        if spec.descending:
+            values = -values
+        # only the first `limit` rows are ordered, found by a linear partition
+        if spec.limit is not None and spec.limit < len(rows):
+            cutoff = values[np.argpartition(values, spec.limit - 1)[spec.limit - 1]]
+            # every row tied with the last one kept competes for its place
+            keep = values <= cutoff
+            rows, values = rows[keep], values[keep]
+        # ties in catalog order
+        return rows[np.lexsort((rows, values))]
+
+    def _ordered(self, spec: FilterSpec) -> np.ndarray:
+        """
+        Orders the whole catalog by the sort column through its presorted index.
+        """
+        column = self.SORT_COLUMNS[spec.sort_by]
+        order = self.store.order(column)
+        # the index is a stable ascending sort, so ties are already in catalog order
+        if not spec.descending or len(order) == 0:
+            return np.asarray(order)
+        if spec.limit is None:
+            return self._sorted(np.arange(len(order)), spec)
+        # the highest values are a suffix of the index, taken with every row tied with its first one
+        values = self.store.values(column)
+        cutoff = values[order[max(0, len(order) - spec.limit)]]
+        start = bisect.bisect_left(order, cutoff, key=lambda row: values[row])
+        return self._sorted(np.asarray(order[start:]), spec)
+
+    def positions(self, spec: FilterSpec) -> np.ndarray:
+        key = spec.cache_key()
+        with self._lock:
+            rows = self._compiled.get(key)
+            if rows is not None:
+                self._compiled.move_to_end(key)
+                self.hits += 1
+                return rows
+        rows = self.compile(spec)
+        with self._lock:
+            self._compiled[key] = rows
+            if len(self._compiled) > MAX_COMPILED_SPECS:
+                self._compiled.popitem(last=False)
+        return rows
+
+    def apply(self, spec: FilterSpec) -> pd.DataFrame:
+        start = time.perf_counter()
+        result = self.store.rows(self.positions(spec))
+        with self._lock:
+            self.filter_ms.append((time.perf_counter() - start) * 1000)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            filter_ms = list(self.filter_ms)
+            compiled, hits, spec_hits = len(self._compiled), self.hits, self.spec_hits
+        return {
+            "rows": len(self.store),
+            "queries": len(filter_ms),
+            "compiled_specs": compiled,
+            "hits": hits,
+            "spec_cache_hits": spec_hits,
+            "last_filter_ms": round(filter_ms[-1], 3) if filter_ms else 0.0,
+            "p50_filter_ms": round(percentile(filter_ms, 50), 3),
+            "p95_filter_ms": round(percentile(filter_ms, 95), 3),
+        }
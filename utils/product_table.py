@@ -0,0 +1,117 @@
+import time
+from typing import Callable, Optional
+
+import pandas as pd
+from langchain_core.documents import Document
+
+from utils.bm25_index import BM25Index
+
+# tokens the product table may take up in the recommendation prompt
+PRODUCT_TABLE_TOKEN_BUDGET = 1200
+DESCRIPTION_MAX_CHARS = 160
+CHARS_PER_TOKEN = 4
+COLUMNS = ("Product_Name", "Category", "Price_USD", "Rating", "Description")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class ProductTableSerializer:
+    """
+    Fits a product table into a token budget for the recommendation prompt.
+
+    Rows are ranked by BM25 relevance of their name, category and
+    description to the user query, with rating breaking ties, unless the
+    filter already put them in the order the user asked for. Descriptions
+    are cut at a word boundary and rows are written as one `|`-delimited
+    line each, without markdown padding, until the budget is spent.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = PRODUCT_TABLE_TOKEN_BUDGET,
+        description_chars: int = DESCRIPTION_MAX_CHARS,
+        count_tokens: Callable[[str], int] = estimate_tokens
+    ):
+        self.token_budget = token_budget
+        self.description_chars = description_chars
+        self.count_tokens = count_tokens
+
+    @staticmethod
+    def rank(df: pd.DataFrame, query: str) -> pd.DataFrame:
+        index = BM25Index()
+        index.upsert(
+            [str(i) for i in range(len(df))],
+            [
+                Document(page_content=f"{name} {category} {description}")
+                for name, category, description in zip(df["Product_Name"], df["Category"], df["Description"])
+            ]
+        )
+        scores = [0.0] * len(df)
+        for doc_id, score in index.search(query, k=len(df)):
+            scores[int(doc_id)] = score
+        ranked = df.assign(_score=scores).sort_values(["_score", "Rating"], ascending=False, kind="stable")
+        return ranked.drop(columns="_score")
+
+    def truncate(self, description: str) -> str:
+        if len(description) <= self.description_chars:
+            return description
+        cut = description[:self.description_chars].rsplit(" ", 1)[0]
+        return cut.rstrip(",.;:") + "…"
+
+    @staticmethod
+    def row_line(values) -> str:
+        # the delimiter is reserved, so it cannot appear inside a field
+        return "|".join(str(value).replace("|", "/").replace("\n", " ") for value in values)
+
+    @staticmethod
+    def markdown_tokens(df: pd.DataFrame, rows: int) -> int:
+        """
+        Estimates the tokens of `rows` rows in the padded markdown `to_markdown()` wrote,
+        from the column widths of `df`.
+        """
+        if df.empty:
+            return 0
+        columns = [df.index.astype(str)] + [df[column].astype(str) for column in df.columns]
+        headers = [""] + list(df.columns)
+        widths = [max(len(header), column.str.len().max()) for header, column in zip(headers, columns)]
+        line = sum(widths) + 3 * len(widths) + 1
+        return (rows + 2) * line // CHARS_PER_TOKEN
+
+    def serialize(self, df: pd.DataFrame, query: str, ranked: bool = False, matched: Optional[int] = None) -> tuple[str, dict]:
+        """
+        Writes the most relevant rows of `df` that fit the token budget.
+
+        Args:
+            df (pd.DataFrame): Candidate products.
+            query (str): The user query the rows are ranked against.
+            ranked (bool): True when `df` is already in the order the user asked for.
+            matched (int): Products the filter matched, when `df` holds only some of them.
+
+        Returns:
+            tuple: The table text and a report with rows and tokens before and after.
+        """
+        start = time.perf_counter()
+        matched = len(df) if matched is None else matched
+        ordered = df if ranked or df.empty else self.rank(df, query)
+        lines = [self.row_line(COLUMNS)]
+        tokens = self.count_tokens(lines[0])
+        for values in ordered[list(COLUMNS)].itertuples(index=False):
+            line = self.row_line((*values[:-1], self.truncate(str(values[-1]))))
+            line_tokens = self.count_tokens(line)
+            # the first row always goes in, an empty table would only make the model improvise
+            if len(lines) > 1 and tokens + line_tokens > self.token_budget:
+                break
+            lines.append(line)
+            tokens += line_tokens
+        before = self.markdown_tokens(df, matched)
+        report = {
+            "matched_rows": matched,
+            "rows": len(lines) - 1,
+            "markdown_tokens": before,
+            "tokens": tokens,
+            "tokens_saved": max(0, before - tokens),
+            "serialize_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+        return "\n".join(lines), report
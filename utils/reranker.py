@@ -0,0 +1,124 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_community.cross_encoders import BaseCrossEncoder
+
+# process-wide rerankers keyed by (model name, max length, backend, quantize)
+_services = {}
+_services_lock = threading.Lock()
+
+
+class RerankerService(BaseCrossEncoder):
+    """
+    Process-wide cross encoder that loads its model once, on first use.
+
+    Pairs are scored in batches of `batch_size`, truncated to `max_length`
+    tokens, and (query, document hash) scores are kept in an LRU cache so
+    repeated queries over the same candidates skip the model entirely.
+    On CPU the model can run int8-quantized (`quantize=True`) or through
+    ONNX Runtime (`backend="onnx"`).
+    """
+
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-reranker-large",
+        batch_size: int = 16,
+        max_length: int = 512,
+        backend: str = "torch",
+        quantize: bool = False,
+        cache_size: int = 4096,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.backend = backend
+        self.quantize = quantize
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self.last_latency_ms = 0.0
+        self.last_pairs = 0
+        self._client = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def shared(
+        model_name: str = "BAAI/bge-reranker-large",
+        batch_size: int = 16,
+        max_length: int = 512,
+        backend: str = "torch",
+        quantize: bool = False,
+    ) -> "RerankerService":
+        key = (model_name, max_length, backend, quantize)
+        with _services_lock:
+            if key not in _services:
+                _services[key] = RerankerService(model_name, batch_size, max_length, backend, quantize)
+            service = _services[key]
+        service.batch_size = batch_size
+        return service
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self._load()
+            return self._client
+
+    def _load(self):
+        # heavy imports stay out of module import time
+        from sentence_transformers import CrossEncoder
+
+        if self.backend == "onnx":
+            return CrossEncoder(self.model_name, max_length=self.max_length, device="cpu", backend="onnx")
+
+        client = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu" if self.quantize else None)
+        if self.quantize:
+            import torch
+
+            client.model = torch.quantization.quantize_dynamic(client.model, {torch.nn.Linear}, dtype=torch.qint8)
+        return client
+
+    def score(self, text_pairs: list[tuple[str, str]]) -> list[float]:
+        start = time.perf_counter()
+        keys = [(query, hashlib.sha256(text.encode("utf-8")).hexdigest()) for query, text in text_pairs]
+        scores = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+            self.hits += len(scores)
+
+        missing = {key: pair for key, pair in zip(keys, text_pairs) if key not in scores}
+        if missing:
+            client = self.client
+            predictions = client.predict(list(missing.values()), batch_size=self.batch_size, show_progress_bar=False)
+            # some rerankers return (not relevant, relevant) logits per pair
+            if len(predictions.shape) > 1:
+                predictions = predictions[:, 1]
+            with self._lock:
+                self.misses += len(missing)
+                for key, value in zip(missing.keys(), predictions):
+                    scores[key] = float(value)
+                    self._cache[key] = float(value)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        self.last_latency_ms = (time.perf_counter() - start) * 1000
+        self.last_pairs = len(text_pairs)
+        return [scores[key] for key in keys]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "loaded": self._client is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "cached_scores": len(self._cache),
+                "last_pairs": self.last_pairs,
+                "last_latency_ms": round(self.last_latency_ms, 1),
+            }
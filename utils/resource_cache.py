@@ -0,0 +1,73 @@
+import threading
+import time
+from typing import Any, Callable, Optional
+
+# process-wide resources keyed by (name, key), shared by every session
+_resources = {}
+_resources_lock = threading.Lock()
+# one lock per resource so a slow build only blocks sessions waiting for that resource
+_build_locks = {}
+
+
+class ResourceCache:
+    """
+    Build-once cache for datasets, chains and retrievers shared across sessions.
+
+    Streamlit reruns the whole page on every interaction; resources fetched
+    through `get_or_build` are built on first use and reused afterwards
+    until invalidated. `key` identifies the inputs a resource was built
+    from (a file's modification time, the configuration of an LLM client)
+    so a changed input builds a new entry, replacing the old one unless
+    `replace=False`. Cached resources are shared, so they must not be
+    mutated by callers.
+    """
+
+    @staticmethod
+    def get_or_build(name: str, build: Callable[[], Any], key: tuple = (), replace: bool = True) -> Any:
+        cache_key = (name, key)
+        with _resources_lock:
+            entry = _resources.get(cache_key)
+            if entry is not None:
+                entry["hits"] += 1
+                return entry["value"]
+            build_lock = _build_locks.setdefault(cache_key, threading.Lock())
+
+        with build_lock:
+            with _resources_lock:
+                # another session may have built it while this one waited
+                entry = _resources.get(cache_key)
+                if entry is not None:
+                    entry["hits"] += 1
+                    return entry["value"]
+            start = time.perf_counter()
+            value = build()
+            build_ms = (time.perf_counter() - start) * 1000
+            with _resources_lock:
+                # older versions of the same resource are dropped once their inputs change,
+                # unless each key is a resource of its own, like one chain per LLM client
+                for stale in [k for k in _resources if k[0] == name and replace]:
+                    del _resources[stale]
+                _resources[cache_key] = {"value": value, "build_ms": build_ms, "hits": 0, "built_at": time.time()}
+        return value
+
+    @staticmethod
+    def invalidate(name: Optional[str] = None) -> int:
+        """
+        Drops the cached resource called `name`, or every resource when no name is given.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        with _resources_lock:
+            stale = [key for key in _resources if name is None or key[0] == name]
+            for key in stale:
+                del _resources[key]
+            return len(stale)
+
+    @staticmethod
+    def stats() -> list[dict]:
+        with _resources_lock:
+            return [
+                {"name": name, "build_ms": round(entry["build_ms"], 1), "hits": entry["hits"]}
+                for (name, _), entry in _resources.items()
+            ]
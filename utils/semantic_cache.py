@@ -0,0 +1,155 @@
+import hashlib
+import itertools
+import math
+import re
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+# process-wide semantic caches keyed by name
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def hashing_embedding(texts: list[str], dim: int = 512) -> list[list[float]]:
+    """
+    Local, deterministic embedding based on hashed word unigrams and bigrams.
+
+    Needs no model or network, which is what the offline fake backend wants.
+    Bags of words score prompts that differ in one meaningful word ("prime"
+    vs "not prime") as near-duplicates, so caches use a real embedding model.
+    """
+    vectors = []
+    for text in texts:
+        tokens = re.findall(r"\w+", text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = [0.0] * dim
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        vectors.append([value / norm for value in vector])
+    return vectors
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class SemanticCache:
+    """
+    Answer cache looked up by embedding similarity instead of exact match.
+
+    Prompts are embedded with `embed_fn` (a function from a list of texts to
+    vectors, or any LangChain `Embeddings`) and compared by cosine similarity
+    against the stored prompts in the same scope. A similarity at or above
+    `threshold` returns the stored answer.
+    """
+
+    def __init__(self, embed_fn: Any, threshold: float = 0.95, max_entries: int = 1000):
+        self.embed_fn = embed_fn.embed_documents if hasattr(embed_fn, "embed_documents") else embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._ids = itertools.count()
+        self._entries = []  # dicts with id, scope, prompt, answer; row i of _matrix
+        self._matrix = None
+        self._lock = threading.Lock()
+        self.hit_ms = []
+        self.miss_ms = []
+
+    @staticmethod
+    def shared(name: str, **kwargs) -> "SemanticCache":
+        with _caches_lock:
+            if name not in _caches:
+                _caches[name] = SemanticCache(**kwargs)
+            return _caches[name]
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embed_fn([text])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, prompt: str, scope: str = "") -> Optional[dict]:
+        vector = self._embed(prompt)
+        with self._lock:
+            if self._matrix is None:
+                return None
+            similarities = self._matrix @ vector
+            for i in np.argsort(-similarities):
+                if similarities[i] < self.threshold:
+                    return None
+                entry = self._entries[i]
+                if entry["scope"] == scope:
+                    return {**entry, "similarity": float(similarities[i])}
+        return None
+
+    def update(self, prompt: str, answer: Any, scope: str = "") -> int:
+        vector = self._embed(prompt)
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries.append({"id": entry_id, "scope": scope, "prompt": prompt, "answer": answer})
+            self._matrix = vector[None, :] if self._matrix is None else np.vstack([self._matrix, vector])
+            # oldest entries go first once the cache is full
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                self._entries = self._entries[overflow:]
+                self._matrix = self._matrix[overflow:]
+        return entry_id
+
+    def invalidate(self, entry_id: int) -> bool:
+        with self._lock:
+            for i, entry in enumerate(self._entries):
+                if entry["id"] == entry_id:
+                    del self._entries[i]
+                    self._matrix = np.delete(self._matrix, i, axis=0) if self._entries else None
+                    return True
+        return False
+
+    def get_or_compute(
+        self,
+        prompt: str,
+        compute: Callable[[], Any],
+        scope: str = "",
+        should_cache: Callable[[Any], bool] = None
+    ) -> tuple[Any, Optional[dict]]:
+        """
+        Returns the cached answer for a similar prompt, else computes and stores a new one.
+
+        Args:
+            prompt (str): The incoming prompt.
+            compute (Callable): Produces the answer on a miss.
+            scope (str): Only entries stored under the same scope can match.
+            should_cache (Callable): Decides whether a computed answer is stored, all are by default.
+
+        Returns:
+            tuple: The answer and the matched cache entry, or None on a miss.
+        """
+        start = time.perf_counter()
+        entry = self.lookup(prompt, scope=scope)
+        if entry is not None:
+            self.hit_ms.append((time.perf_counter() - start) * 1000)
+            return entry["answer"], entry
+        answer = compute()
+        if should_cache is None or should_cache(answer):
+            self.update(prompt, answer, scope=scope)
+        self.miss_ms.append((time.perf_counter() - start) * 1000)
+        return answer, None
+
+    def stats(self) -> dict:
+        hits, misses = len(self.hit_ms), len(self.miss_ms)
+        return {
+            "entries": len(self._entries),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "hit_p50_ms": round(percentile(self.hit_ms, 50), 1),
+            "hit_p95_ms": round(percentile(self.hit_ms, 95), 1),
+            "miss_p50_ms": round(percentile(self.miss_ms, 50), 1),
+            "miss_p95_ms": round(percentile(self.miss_ms, 95), 1),
+        }
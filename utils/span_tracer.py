@@ -0,0 +1,223 @@
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+# every Runnable invoked while a tracer is active reports to it, without passing callbacks around
+_active_tracer: ContextVar[Optional["SpanTracer"]] = ContextVar("span_tracer", default=None)
+register_configure_hook(_active_tracer, inheritable=True)
+
+
+class SpanTracer(BaseCallbackHandler):
+    """
+    Callback handler that records every chain, LLM, retriever and tool call as a span tree.
+
+    Each span keeps its wall time, its queue time (how long it waited after
+    its parent started or its previous sibling finished), token usage, whether
+    the response came from the LLM cache and how many retries it took.
+    """
+
+    def __init__(self, name: str = "trace"):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.spans = {}  # run_id -> span dict, in start order
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        token = _active_tracer.set(self)
+        try:
+            yield self
+        finally:
+            _active_tracer.reset(token)
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], span_type: str, name: str, tags: Optional[list]) -> None:
+        tags = tags or []
+        attempt = next((int(tag.rsplit(":", 1)[1]) for tag in tags if tag.startswith("retry:attempt:")), 1)
+        with self._lock:
+            parent = self.spans.get(parent_run_id)
+            self.spans[run_id] = {
+                "trace_id": self.trace_id,
+                "span_id": str(run_id),
+                "parent_id": str(parent_run_id) if parent else None,
+                "name": name,
+                "type": span_type,
+                "started_at": time.time(),
+                "start": time.perf_counter(),
+                "end": None,
+                "wall_ms": None,
+                "queue_ms": 0.0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "cache_hit": None,
+                "retries": 0,
+                "error": None,
+            }
+            if parent is not None and attempt > 1:
+                parent["retries"] = max(parent["retries"], attempt - 1)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[dict]:
+        with self._lock:
+            span = self.spans.get(run_id)
+            if span is None:
+                return None
+            span["end"] = time.perf_counter()
+            span["wall_ms"] = round((span["end"] - span["start"]) * 1000, 1)
+            if error is not None:
+                span["error"] = f"{type(error).__name__}: {error}"
+            return span
+
+    @staticmethod
+    def _name(serialized: Optional[dict], kwargs: dict, default: str) -> str:
+        if kwargs.get("name"):
+            return kwargs["name"]
+        if serialized:
+            return serialized.get("name") or (serialized.get("id") or [default])[-1]
+        return default
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, **kwargs) -> None:
+        self._start(run_id, parent_run_id, "chain", self._name(serialized, kwargs, "chain"), tags)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, tags=None, **kwargs) -> None:
+        self._start(run_id, parent_run_id, "llm", self._name(serialized, kwargs, "llm"), tags)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None, **kwargs) -> None:
+        self._start(run_id, parent_run_id, "llm", self._name(serialized, kwargs, "chat_model"), tags)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs) -> None:
+        span = self._end(run_id)
+        if span is None:
+            return
+        cache_hit = False
+        for generation in (g for generations in response.generations for g in generations):
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None) or {}
+            span["input_tokens"] += usage.get("input_tokens", 0)
+            span["output_tokens"] += usage.get("output_tokens", 0)
+            cache_hit = cache_hit or bool(getattr(message, "response_metadata", {}).get("cache_hit"))
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        if not span["input_tokens"] and not span["output_tokens"]:
+            span["input_tokens"] = token_usage.get("prompt_tokens", 0)
+            span["output_tokens"] = token_usage.get("completion_tokens", 0)
+        span["cache_hit"] = cache_hit
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, tags=None, **kwargs) -> None:
+        self._start(run_id, parent_run_id, "retriever", self._name(serialized, kwargs, "retriever"), tags)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, tags=None, **kwargs) -> None:
+        self._start(run_id, parent_run_id, "tool", self._name(serialized, kwargs, "tool"), tags)
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_retry(self, retry_state: Any, *, run_id, **kwargs) -> None:
+        with self._lock:
+            if run_id in self.spans:
+                self.spans[run_id]["retries"] += 1
+
+    def tree(self) -> list[dict]:
+        """
+        Returns the root spans, each with its `children` nested in start order.
+        """
+        with self._lock:
+            spans = [dict(span, children=[]) for span in self.spans.values()]
+        by_id = {span["span_id"]: span for span in spans}
+        roots = []
+        for span in spans:
+            parent = by_id.get(span["parent_id"])
+            (parent["children"] if parent else roots).append(span)
+
+        def settle(siblings, ready_at):
+            # a span queued from when its parent started or the latest sibling before it finished
+            for span in siblings:
+                finished = [s["end"] for s in siblings if s["end"] is not None and s["end"] <= span["start"]]
+                span["queue_ms"] = round(max(0.0, span["start"] - max([ready_at, *finished])) * 1000, 1)
+                settle(span["children"], span["start"])
+
+        for root in roots:
+            settle(root["children"], root["start"])
+        return roots
+
+    def summary(self) -> dict:
+        with self._lock:
+            spans = list(self.spans.values())
+        llm_spans = [span for span in spans if span["type"] == "llm"]
+        roots = [span for span in spans if span["parent_id"] is None and span["wall_ms"] is not None]
+        return {
+            "spans": len(spans),
+            "wall_ms": round(sum(span["wall_ms"] for span in roots), 1),
+            "llm_calls": len(llm_spans),
+            # cached responses cost no tokens
+            "input_tokens": sum(span["input_tokens"] for span in llm_spans if not span["cache_hit"]),
+            "output_tokens": sum(span["output_tokens"] for span in llm_spans if not span["cache_hit"]),
+            "cache_hits": sum(1 for span in llm_spans if span["cache_hit"]),
+            "retries": sum(span["retries"] for span in spans),
+        }
+
+    def render(self) -> str:
+        lines = []
+
+        def walk(span, depth):
+            details = [f"{span['wall_ms']} ms" if span["wall_ms"] is not None else "running"]
+            if span["queue_ms"]:
+                details.append(f"queued {span['queue_ms']} ms")
+            if span["input_tokens"] or span["output_tokens"]:
+                details.append(f"{span['input_tokens']}→{span['output_tokens']} tokens")
+            if span["cache_hit"]:
+                details.append("cache hit")
+            if span["retries"]:
+                details.append(f"{span['retries']} retries")
+            if span["error"]:
+                details.append(f"error {span['error'][:80]}")
+            lines.append(f"{'  ' * depth}{span['name']} [{span['type']}] {' | '.join(details)}")
+            for child in span["children"]:
+                walk(child, depth + 1)
+
+        for root in self.tree():
+            walk(root, 0)
+        return "\n".join(lines)
+
+    def export_jsonl(self, path: str = "./traces.jsonl") -> int:
+        """
+        Appends one JSON line per span to `path` and returns the number of spans written.
+        """
+        rows = []
+
+        def flatten(span, depth):
+            children = span.pop("children")
+            rows.append({**span, "trace_name": self.name, "depth": depth})
+            for child in children:
+                flatten(child, depth + 1)
+
+        for root in self.tree():
+            flatten(root, 0)
+        with open(path, "a", encoding="utf-8") as file:
+            for row in rows:
+                file.write(json.dumps(row) + "\n")
+        return len(rows)